@@ -7,3 +7,35 @@
 """
 __init__.py
 """
+
+import sys
+import types
+import importlib
+
+# submodules are imported on first attribute access, so that importing the
+# package stays cheap
+_submodules = ('bench', 'cache', 'instrument', 'mympl', 'perf', 'pipeline',
+               'scheduler', 'shmpool', 'utils', 'watch')
+
+
+class _LazyPackage(types.ModuleType):
+    '''the package module, importing submodules when asked for'''
+
+    def __getattr__(self, name):
+        # only called when the attribute is not there yet
+        if name in _submodules:
+            return importlib.import_module('.' + name, self.__name__)
+        raise AttributeError(
+            "module '{0}' has no attribute '{1}'".format(self.__name__, name))
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_submodules))
+
+
+# python 2 has no module level __getattr__, swap the module in sys.modules
+# for one that does; the import machinery returns what is there
+_package = _LazyPackage(__name__, __doc__)
+_package.__dict__.update(globals())
+# python 2 clears the globals of a freed module, keep this one alive
+_package._module = sys.modules[__name__]
+sys.modules[__name__] = _package
@@ -0,0 +1,295 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Create Date    :  2026-10-19 11:02
+# Python Version :  %PYVER%
+# Git Repo       :  https://github.com/Jerry-Ma
+# Email Address  :  jerry.ma.nk@gmail.com
+"""
+run.py
+
+Time the hot paths on synthetic data, store the result under the current
+commit and compare against a baseline:
+
+    python -m pyjerry.bench.run [--baseline COMMIT|FILE] [--threshold 0.2]
+
+The run fails (exit status 1) when any benchmark is slower than the
+baseline by more than the threshold, or when importing a module takes
+longer than its budget in IMPORT_BUDGET.
+
+Results go to bench/results/ (--outdir); only baseline.json there is
+meant to be committed, the per-commit files are ignored by git.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import logging
+import tempfile
+import subprocess
+from StringIO import StringIO
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+
+from . import synthetic
+from .. import utils
+from .. import mympl
+from ..instrument import spitzer
+from ..instrument import wiyn
+
+BENCHMARKS = []
+
+# seconds on top of the interpreter start up
+IMPORT_BUDGET = {
+    'utils': 0.25,
+    'mympl': 0.4,   # about 0.14s here, 0.5s when it imports pyplot
+    }
+
+
+def benchmark(func):
+    '''Register a benchmark. The function does the setup in `workdir` and
+    returns the callable to be timed'''
+    BENCHMARKS.append(func)
+    return func
+
+
+class _quiet(object):
+    '''silence the prints of the instrument modules'''
+
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+
+    def __exit__(self, *args):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+
+@benchmark
+def sorted_glob(workdir):
+    synthetic.make_aor_tree(workdir, naor=4, nframe=250)
+    pattern = os.path.join(workdir, 'r*', 'ch1', 'bcd', '*_cbcd.fits')
+    return lambda: utils.sorted_glob(pattern)
+
+
+@benchmark
+def spitzer_obs(workdir):
+    aors = synthetic.make_aor_tree(workdir, naor=8, nframe=100)
+    bcds = [spitzer.SpitzerBCD(aor, workdir) for aor in aors]
+
+    def run():
+        with _quiet():
+            spitzer.SpitzerOBS(bcds, 'ch1')
+    return run
+
+
+@benchmark
+def dump_astromatic_conf(workdir):
+    template = synthetic.make_astromatic_template(nkey=400)
+    outfile = os.path.join(workdir, 'default.sex')
+    overrides = dict(('KEY_{0:03d}'.format(i), 'new{0:d}'.format(i))
+                     for i in range(0, 400, 3))
+    return lambda: utils.dump_astromatic_conf(
+        StringIO(template), outfile, clobber=True, **overrides)
+
+
+@benchmark
+def mopex_namelist_dump(workdir):
+    template = synthetic.make_mopex_namelist(
+        os.path.join(workdir, 'mosaic.nl'), nmodule=20, nkey=40)
+    nl = spitzer.MopexNameList(template)
+    outfile = os.path.join(workdir, 'out.nl')
+    return lambda: nl.dump(outfile, MODULE3={'key_1': 'x'}, run_key_2='y')
+
+
+@benchmark
+def wiyn_skeleton(workdir):
+    return lambda: wiyn.make_skeleton(binning=11.0)
+
+
+@benchmark
+def canvasn_construction(workdir):
+
+    def run():
+        canvas = mympl.CanvasN(ngrid=36, tile=(4, 9), aspect=0.5)
+        matplotlib.pyplot.close(canvas.fig)
+    return run
+
+
+@benchmark
+def canvasn_large(workdir):
+
+    def run():
+        canvas = mympl.CanvasN(ngrid=121, tile=(11, 11), aspect=1.)
+        matplotlib.pyplot.close(canvas.fig)
+    return run
+
+
+@benchmark
+def figure_save(workdir):
+    cat = synthetic.make_wiyn_catalog(nsrc=20000)
+    savename = os.path.join(workdir, 'mag_err.png')
+
+    def run():
+        canvas = mympl.CanvasOne()
+        canvas.axes[0].plot(cat['mag'], cat['magerr'], ',')
+        canvas.save_or_show(savename, save=True)
+        matplotlib.pyplot.close(canvas.fig)
+    return run
+
+
+@benchmark
+def cfht_mosaic(workdir):
+    cat = synthetic.make_cfht_catalog(nsrc=100000)
+    savename = os.path.join(workdir, 'cfht_counts.png')
+
+    def run():
+        counts = np.bincount(cat['ext'], minlength=37)[1:]
+        canvas = mympl.CanvasMosaic.cfht(values=counts)
+        canvas.save(savename)
+        canvas.close()
+    return run
+
+
+def _wall(cmd, repeat, env=None):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.time()
+        subprocess.check_call(cmd, env=env)
+        best = min(best, time.time() - t0)
+    return best
+
+
+def import_times(repeat=5):
+    '''Return the best-of-`repeat` import time of the modules in
+    IMPORT_BUDGET, each in a fresh interpreter'''
+    pkg = __package__.split('.')[0]
+    pkgdir = os.path.abspath(sys.modules[pkg].__path__[0])
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(pkgdir))
+    t0 = _wall([sys.executable, '-c', 'pass'], repeat)
+    results = {}
+    for module in sorted(IMPORT_BUDGET):
+        t = _wall([sys.executable, '-c', 'import {0}.{1}'.format(
+            pkg, module)], repeat, env=env) - t0
+        results['import_' + module] = t
+        print('{0:24s} {1:10.4f} s'.format('import_' + module, t))
+    return results
+
+
+def check_import_budget(results):
+    '''Return the modules taking longer than their budget to import'''
+    return [m for m, budget in sorted(IMPORT_BUDGET.items())
+            if results.get('import_' + m, 0) > budget]
+
+
+def run_benchmarks(names=None, repeat=5):
+    '''Return the best-of-`repeat` wall time of each benchmark'''
+    logging.getLogger().setLevel(logging.WARNING)
+    # time our code, not the latex installation
+    mympl.use_style(usetex=False)
+    results = {}
+    for func in BENCHMARKS:
+        name = func.__name__
+        if names and name not in names:
+            continue
+        workdir = tempfile.mkdtemp(prefix='bench_')
+        try:
+            stmt = func(workdir)
+            stmt()  # warm up
+            best = float('inf')
+            for _ in range(repeat):
+                t0 = time.time()
+                stmt()
+                best = min(best, time.time() - t0)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        results[name] = best
+        print('{0:24s} {1:10.4f} s'.format(name, best))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__))
+            ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def load_results(baseline, outdir):
+    fname = baseline if os.path.isfile(baseline) else os.path.join(
+        outdir, '{0}.json'.format(baseline))
+    with open(fname) as fo:
+        return json.load(fo)
+
+
+def compare(results, baseline, threshold):
+    '''Return the benchmarks slower than baseline by more than
+    `threshold` (fractional)'''
+    regressions = []
+    for name, t in sorted(results.items()):
+        t0 = baseline.get(name)
+        if t0 is None:
+            continue
+        ratio = t / t0 if t0 > 0 else 1.
+        flag = 'REGRESSION' if ratio > 1 + threshold else ''
+        print('{0:24s} {1:10.4f} s {2:10.4f} s {3:6.2f}x {4}'.format(
+            name, t0, t, ratio, flag))
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='benchmark the hot paths on synthetic data')
+    parser.add_argument('--only', nargs='*', help='benchmarks to run')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--outdir', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'results'))
+    parser.add_argument('--baseline', default='baseline',
+                        help='commit id or json file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed fractional slowdown')
+    parser.add_argument('--set-baseline', action='store_true',
+                        help='store the results as the baseline')
+    args = parser.parse_args(argv)
+
+    commit = git_commit()
+    results = run_benchmarks(args.only, repeat=args.repeat)
+    if not args.only:
+        results.update(import_times(repeat=args.repeat))
+    over_budget = check_import_budget(results)
+    if not os.path.isdir(args.outdir):
+        os.makedirs(args.outdir)
+    record = {'commit': commit, 'time': time.time(),
+              'python': sys.version.split()[0], 'results': results}
+    with open(os.path.join(args.outdir, commit + '.json'), 'w') as fo:
+        json.dump(record, fo, indent=2, sort_keys=True)
+    if over_budget:
+        print('import over budget: {0}'.format(', '.join(over_budget)))
+    if args.set_baseline:
+        shutil.copy(os.path.join(args.outdir, commit + '.json'),
+                    os.path.join(args.outdir, 'baseline.json'))
+        return 1 if over_budget else 0
+    try:
+        baseline = load_results(args.baseline, args.outdir)
+    except (IOError, OSError):
+        print('no baseline {0}, skip comparison'.format(args.baseline))
+        return 1 if over_budget else 0
+    print('compare with {0}:'.format(baseline['commit']))
+    regressions = compare(results, baseline['results'], args.threshold)
+    if regressions:
+        print('regression in: {0}'.format(', '.join(regressions)))
+    return 1 if regressions or over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Create Date    :  2026-10-19 10:48
+# Python Version :  %PYVER%
+# Git Repo       :  https://github.com/Jerry-Ma
+# Email Address  :  jerry.ma.nk@gmail.com
+"""
+synthetic.py
+
+Generators of fake data trees, templates and catalogs for benchmarking
+"""
+
+import os
+import numpy as np
+
+from ..instrument import wiyn
+from ..instrument import cfht
+
+
+def touch(fname):
+    with open(fname, 'a'):
+        pass
+    return fname
+
+
+def make_aor_tree(rootdir, naor=4, nframe=50, chan='ch1',
+                  suffixes=('_cbcd.fits', '_cbunc.fits', '_bimsk.fits')):
+    '''Create a Spitzer download tree of empty BCD files,
+    rootdir/r<aor>/<chan>/bcd/SPITZER_..., and return the AOR ids'''
+    aors = [10000000 + i * 256 for i in range(naor)]
+    for aor in aors:
+        bcddir = os.path.join(rootdir, 'r{0:d}'.format(aor), chan, 'bcd')
+        if not os.path.isdir(bcddir):
+            os.makedirs(bcddir)
+        for i in range(nframe):
+            for suffix in suffixes:
+                touch(os.path.join(bcddir, 'SPITZER_I1_{0:d}_{1:04d}_0000_1'
+                                           '{2}'.format(aor, i, suffix)))
+    return aors
+
+
+def make_astromatic_template(nkey=200):
+    '''Return the text of a SExtractor-like config with `nkey` entries'''
+    lines = ['# Default configuration file for SExtractor', '']
+    for i in range(nkey):
+        if i % 20 == 0:
+            lines.append('#{0:-^40}'.format(' Section {0:d} '.format(i)))
+        lines.append('KEY_{0:03d}{1:10s}{2:<16s}# comment {0:d}'.format(
+            i, '', 'value{0:d}'.format(i)))
+    return '\n'.join(lines) + '\n'
+
+
+def make_mopex_namelist(fname, nmodule=10, nkey=20):
+    '''Write a MOPEX-like namelist template and return its name'''
+    lines = ['# MOPEX namelist']
+    for i in range(nkey):
+        lines.append('run_key_{0:d} = {0:d}'.format(i))
+    for m in range(nmodule):
+        lines.append('&MODULE{0:d}'.format(m))
+        for i in range(nkey):
+            lines.append('key_{0:d} = {0:d}'.format(i))
+        lines.append('&END')
+    with open(fname, 'w') as fo:
+        fo.write('\n'.join(lines) + '\n')
+    return fname
+
+
+catalog_dtype = [('ext', 'i4'), ('x', 'f8'), ('y', 'f8'),
+                 ('mag', 'f8'), ('magerr', 'f8')]
+
+
+def _fill_catalog(cat, rng):
+    cat['mag'] = 26 - rng.exponential(2.5, len(cat))
+    cat['magerr'] = 10 ** (0.4 * (cat['mag'] - 26)) + \
+        rng.normal(0, 0.005, len(cat)).clip(0)
+    return cat
+
+
+def make_wiyn_catalog(nsrc=100000, binning=11.0, seed=0):
+    '''Return a catalog of sources spread over the ODI OTAs, in global
+    layout coordinates'''
+    rng = np.random.RandomState(seed)
+    wl = wiyn.WIYNLayout(binning=binning)
+    cat = np.zeros(nsrc, dtype=catalog_dtype)
+    cat['ext'] = rng.randint(1, len(wiyn.WIYNFact.ota_order) + 1, nsrc)
+    oxy = np.array(wiyn.WIYNFact.ota_order)[cat['ext'] - 1]
+    x, y = wl.get_xy_from_oxy(oxy // 10, oxy % 10,
+                              rng.uniform(0, wl.OW, nsrc),
+                              rng.uniform(0, wl.OH, nsrc))
+    cat['x'] = x
+    cat['y'] = y
+    return _fill_catalog(cat, rng)
+
+
+def make_cfht_catalog(nsrc=100000, seed=0):
+    '''Return a catalog of sources spread over the MegaCam chips, in
+    chip coordinates'''
+    rng = np.random.RandomState(seed)
+    (x0, x1), (y0, y1) = cfht.get_chip_rect()
+    cat = np.zeros(nsrc, dtype=catalog_dtype)
+    cat['ext'] = rng.randint(1, cfht.get_chip_num() + 1, nsrc)
+    cat['x'] = rng.uniform(x0, x1, nsrc)
+    cat['y'] = rng.uniform(y0, y1, nsrc)
+    return _fill_catalog(cat, rng)
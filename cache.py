@@ -0,0 +1,306 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Create Date    :  2026-10-19 09:12
+# Python Version :  %PYVER%
+# Git Repo       :  https://github.com/Jerry-Ma
+# Email Address  :  jerry.ma.nk@gmail.com
+"""
+cache.py
+
+Content-addressed cache for files generated by pipeline steps
+"""
+
+import os
+import json
+import fcntl
+import atexit
+import time
+import shutil
+import hashlib
+import logging
+
+
+def file_stat(fname):
+    '''Return the (path, size, mtime) triple used to fingerprint a file'''
+    st = os.stat(fname)
+    return [os.path.abspath(fname), st.st_size, st.st_mtime]
+
+
+def file_digest(fname, blocksize=1 << 20):
+    '''Return the sha1 hex digest of the content of a file'''
+    h = hashlib.sha1()
+    with open(fname, 'rb') as fo:
+        for block in iter(lambda: fo.read(blocksize), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _canonical(item):
+    # dicts as sorted items, so that the repr does not depend on order
+    if isinstance(item, dict):
+        return sorted((k, _canonical(v)) for k, v in item.items())
+    if isinstance(item, (list, tuple)):
+        return [_canonical(i) for i in item]
+    return item
+
+
+def fingerprint(items, files=None):
+    '''Return a hex digest of `items` (strings, numbers, and lists and
+    dicts of them) together with the stats of the input `files`'''
+    stats = [file_stat(f) for f in files or [] if os.path.isfile(f)]
+    # repr rather than json, which has no C encoder for sorted keys
+    blob = repr(_canonical([items, stats]))
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+
+class OutputCache(object):
+    '''
+    Keep copies of generated files indexed by the fingerprint of the
+    inputs that produced them. Entries are evicted in LRU order once the
+    total size of the stored copies exceeds `max_size` bytes.
+
+    Changes are kept in memory and written to the manifest every
+    `flush_every` of them, on `close` and at exit; hits only update the
+    access time, written with the next flush. Writing merges with the
+    manifest on disk, so processes sharing the cache keep each other's
+    entries.
+    '''
+
+    manifest_name = 'manifest.json'
+
+    def __init__(self, cachedir, max_size=256 * 1024 ** 2, flush_every=64):
+        self.logger = logging.getLogger(__name__)
+        self.cachedir = os.path.abspath(cachedir)
+        self.blobdir = os.path.join(self.cachedir, 'blobs')
+        if not os.path.isdir(self.blobdir):
+            os.makedirs(self.blobdir)
+        self.max_size = max_size
+        self.flush_every = flush_every
+        self._changed = set()
+        self._removed = set()
+        self._hits = set()
+        self._set_manifest(self._load())
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    @staticmethod
+    def fingerprint(items, files=None):
+        return fingerprint(items, files=files)
+
+    def _manifest_path(self):
+        return os.path.join(self.cachedir, self.manifest_name)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blobdir, digest[:2], digest)
+
+    def _load(self):
+        try:
+            with open(self._manifest_path(), 'r') as fo:
+                return json.load(fo)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _set_manifest(self, manifest):
+        self.manifest = manifest
+        # blob -> [size, number of entries using it]
+        self._blobs = {}
+        self._size = 0
+        for entry in manifest.values():
+            self._ref(entry)
+
+    def _ref(self, entry):
+        for digest, size in zip(entry['blobs'], entry['sizes']):
+            ref = self._blobs.setdefault(digest, [size, 0])
+            if ref[1] == 0:
+                self._size += size
+            ref[1] += 1
+
+    def _unref(self, entry):
+        '''Return the blobs no longer used by any entry'''
+        dead = []
+        for digest in entry['blobs']:
+            ref = self._blobs.get(digest)
+            if ref is None:
+                continue
+            ref[1] -= 1
+            if ref[1] == 0:
+                del self._blobs[digest]
+                self._size -= ref[0]
+                dead.append(digest)
+        return dead
+
+    def _drop(self, key):
+        entry = self.manifest.pop(key)
+        self._changed.discard(key)
+        self._hits.discard(key)
+        self._removed.add(key)
+        return self._unref(entry)
+
+    def _touch(self, key):
+        self._changed.add(key)
+        self._removed.discard(key)
+        if len(self._changed) + len(self._removed) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        '''Merge the changes into the manifest on disk'''
+        if not self._changed and not self._removed and not self._hits:
+            return
+        with open(self._manifest_path() + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            manifest = self._load()
+            for key in self._removed:
+                manifest.pop(key, None)
+            for key in self._changed:
+                ours = self.manifest[key]
+                theirs = manifest.get(key)
+                if theirs is None or theirs['atime'] <= ours['atime']:
+                    manifest[key] = ours
+            for key in self._hits - self._changed:
+                # only the access time, and not for entries dropped since
+                theirs = manifest.get(key)
+                ours = self.manifest.get(key)
+                if theirs is not None and ours is not None:
+                    theirs['atime'] = max(theirs['atime'], ours['atime'])
+            tmp = '{0}.{1:d}'.format(self._manifest_path(), os.getpid())
+            with open(tmp, 'w') as fo:
+                # json.dump to a file does not use the C encoder
+                fo.write(json.dumps(manifest))
+            os.rename(tmp, self._manifest_path())
+        self._changed.clear()
+        self._removed.clear()
+        self._hits.clear()
+        self._set_manifest(manifest)
+
+    def close(self):
+        try:
+            self.flush()
+        except (IOError, OSError) as e:
+            self.logger.warning("cache not saved: {0}".format(e))
+
+    def fetch(self, key, outfiles, clobber=False):
+        '''Make sure `outfiles` hold the cached content for `key`.
+
+        Files that are untouched since they were stored are left alone,
+        missing ones are restored from the stored copies; files changed
+        since are only overwritten with `clobber`. Return False if there
+        is no usable entry, or a changed file is in the way'''
+        entry = self.manifest.get(key)
+        if entry is None or entry['outputs'] != [
+                os.path.abspath(f) for f in outfiles]:
+            return False
+        restore = []
+        for outfile, digest, stat in zip(
+                entry['outputs'], entry['blobs'], entry['stats']):
+            if os.path.isfile(outfile):
+                if file_stat(outfile) == stat:
+                    continue
+                if not clobber:
+                    return False
+            restore.append((outfile, digest, stat))
+        entry['atime'] = time.time()
+        if not restore:
+            self._hits.add(key)
+            return True
+        for outfile, digest, stat in restore:
+            blob = self._blob_path(digest)
+            if not os.path.isfile(blob):
+                self._drop(key)
+                return False
+            if not os.path.isdir(os.path.dirname(outfile)):
+                os.makedirs(os.path.dirname(outfile))
+            shutil.copyfile(blob, outfile)
+            stat[:] = file_stat(outfile)
+            self.logger.debug("restore {0:s}".format(outfile))
+        self._touch(key)
+        return True
+
+    def store(self, key, outfiles):
+        '''Record `outfiles` as the product of `key`'''
+        outputs = [os.path.abspath(f) for f in outfiles]
+        blobs = []
+        sizes = []
+        for outfile in outputs:
+            digest = file_digest(outfile)
+            blob = self._blob_path(digest)
+            if not os.path.isfile(blob):
+                if not os.path.isdir(os.path.dirname(blob)):
+                    os.makedirs(os.path.dirname(blob))
+                shutil.copyfile(outfile, blob)
+            blobs.append(digest)
+            sizes.append(os.path.getsize(blob))
+        if key in self.manifest:
+            self._drop(key)
+        entry = self.manifest[key] = {
+            'outputs': outputs,
+            'blobs': blobs,
+            'stats': [file_stat(f) for f in outputs],
+            'sizes': sizes,
+            'atime': time.time(),
+            }
+        self._ref(entry)
+        self.evict()
+        self._touch(key)
+
+    def total_size(self):
+        '''Return the size of the stored copies, counting shared ones once'''
+        return self._size
+
+    def evict(self):
+        '''Drop least recently used entries until under `max_size`; the
+        most recent entry is always kept'''
+        if self._size <= self.max_size:
+            return
+        lru = sorted(self.manifest, key=lambda k: self.manifest[k]['atime'])
+        for key in lru[:-1]:
+            if self._size <= self.max_size:
+                break
+            for digest in self._drop(key):
+                try:
+                    os.remove(self._blob_path(digest))
+                except OSError:
+                    pass
+            self.logger.debug("evict {0:s}".format(key))
+
+    def clear(self):
+        self._removed.update(self.manifest)
+        self._changed.clear()
+        self._set_manifest({})
+        shutil.rmtree(self.blobdir, ignore_errors=True)
+        os.makedirs(self.blobdir)
+        self.flush()
+
+
+def prune_dir(dirname, max_size):
+    '''Remove the least recently used files in `dirname` until its size is
+    under `max_size` bytes. Files sharing the name up to the first dot are
+    removed together; return the number of bytes freed'''
+    groups = {}
+    for name in os.listdir(dirname):
+        fname = os.path.join(dirname, name)
+        try:
+            st = os.stat(fname)
+        except OSError:
+            continue
+        group = groups.setdefault(name.split('.', 1)[0], [0, 0, []])
+        group[0] = max(group[0], st.st_atime, st.st_mtime)
+        group[1] += st.st_size
+        group[2].append(fname)
+    total = sum(g[1] for g in groups.values())
+    freed = 0
+    for used, size, fnames in sorted(groups.values()):
+        if total - freed <= max_size:
+            break
+        for fname in fnames:
+            try:
+                os.remove(fname)
+            except OSError:
+                pass
+        freed += size
+    return freed
@@ -35,3 +35,15 @@ def get_chip_xy(ext):
     y = (ext - 1) / nx + 1
     x = (ext - 1) % nx + 1
     return 10 * x + y
+
+
+def get_chip_rects(gap=(0, 0)):
+    '''Return rects (l, r, b, t) of all chips in extension order, laid
+    out as in get_chip_xy with `gap` pixels between chips'''
+    import numpy as np
+    (_, w), (_, h) = get_chip_rect()
+    ny, nx = get_chip_layout()
+    ext = np.arange(get_chip_num())
+    left = (ext % nx) * (w + gap[0])
+    bottom = (ext // nx) * (h + gap[1])
+    return np.column_stack([left, left + w, bottom, bottom + h])
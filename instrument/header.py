@@ -0,0 +1,164 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Create Date    :  2026-10-19 13:15
+# Python Version :  %PYVER%
+# Git Repo       :  https://github.com/Jerry-Ma
+# Email Address  :  jerry.ma.nk@gmail.com
+"""
+header.py
+
+Persistent index of FITS header keywords, shared by the instrument modules
+
+    index = HeaderIndex('headers.sqlite')
+    index.refresh(sorted_glob('r*/ch1/bcd/*_cbcd.fits'))
+    phot = index.query('AOT_TYPE', like='%Phot%')
+"""
+
+import os
+import json
+import sqlite3
+import logging
+from multiprocessing import Pool, cpu_count
+
+from .. import perf
+
+
+DEFAULT_KEYS = (
+    'OBJECT', 'EXPTIME', 'FILTER', 'DATE-OBS', 'MJD-OBS', 'RA', 'DEC',
+    'NAXIS1', 'NAXIS2', 'EXTNAME',
+    # spitzer
+    'AOT_TYPE', 'AORKEY', 'CHNLNUM', 'FOVID',
+    # cfht
+    'EXPNUM', 'CCDNAME', 'RUNID',
+    # wiyn
+    'OTA', 'OBSID',
+    )
+
+
+def read_headers(args):
+    '''Return (fname, [(ext, key, value), ...]) for the wanted keys in
+    each extension of a FITS file; keys=None for all keys'''
+    from astropy.io import fits
+
+    fname, keys = args
+    entries = []
+    with perf.timer('fits_io.read_headers'):
+        with fits.open(fname, memmap=True) as hdulist:
+            for ext, hdu in enumerate(hdulist):
+                header = hdu.header
+                for key in keys if keys is not None else header.keys():
+                    if key in header and \
+                            key not in ('COMMENT', 'HISTORY', ''):
+                        entries.append((ext, key, header[key]))
+    return fname, entries
+
+
+def _read_headers_job(args):
+    return perf.worker_result(read_headers(args))
+
+
+class HeaderIndex(object):
+    '''
+    SQLite backed index of selected header keywords per file and
+    extension. Entries are refreshed when the size or mtime of the file
+    changes; files checked once, by `refresh` or a lookup, are not
+    checked again by later lookups unless asked to.
+    '''
+
+    def __init__(self, dbfile, keys=DEFAULT_KEYS):
+        self.logger = logging.getLogger(__name__)
+        self.dbfile = dbfile
+        self.keys = None if keys is None else tuple(keys)
+        self._checked = set()
+        self.db = sqlite3.connect(dbfile)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, size INTEGER, mtime REAL);
+            CREATE TABLE IF NOT EXISTS headers (
+                path TEXT, ext INTEGER, key TEXT, value TEXT, text TEXT,
+                PRIMARY KEY (path, ext, key));
+            CREATE INDEX IF NOT EXISTS headers_key
+                ON headers (key, text);
+            ''')
+
+    def close(self):
+        self.db.close()
+
+    def stale(self, files):
+        '''Return the files whose index entry is missing or outdated'''
+        stale = []
+        for fname in files:
+            fname = os.path.abspath(fname)
+            st = os.stat(fname)
+            known = self.db.execute(
+                'SELECT size, mtime FROM files WHERE path = ?',
+                (fname, )).fetchone()
+            if known is None or tuple(known) != (st.st_size, st.st_mtime):
+                stale.append(fname)
+        return stale
+
+    def refresh(self, files, nproc=None):
+        '''Index the headers of `files` that changed since last time,
+        reading them with `nproc` processes; return the refreshed files'''
+        files = [os.path.abspath(f) for f in files]
+        stale = self.stale(files)
+        self._checked.update(files)
+        if not stale:
+            return stale
+        jobs = [(f, self.keys) for f in stale]
+        nproc = min(nproc or cpu_count(), len(jobs))
+        if nproc > 1:
+            pool = Pool(nproc, perf.worker_init)
+            try:
+                results = pool.imap_unordered(
+                    _read_headers_job, jobs,
+                    chunksize=max(1, len(jobs) // (4 * nproc)))
+                self._store(perf.merge_results(results))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            self._store(map(read_headers, jobs))
+        perf.count('fits_io.header_index', len(stale))
+        self.logger.info("indexed {0:d} files".format(len(stale)))
+        return stale
+
+    def _store(self, results):
+        with self.db:
+            for fname, entries in results:
+                st = os.stat(fname)
+                self.db.execute('DELETE FROM headers WHERE path = ?',
+                                (fname, ))
+                self.db.executemany(
+                    'INSERT INTO headers VALUES (?, ?, ?, ?, ?)',
+                    [(fname, ext, key, json.dumps(value, default=str),
+                      str(value)) for ext, key, value in entries])
+                self.db.execute(
+                    'INSERT OR REPLACE INTO files VALUES (?, ?, ?)',
+                    (fname, st.st_size, st.st_mtime))
+
+    def header(self, fname, ext=0, refresh=False):
+        '''Return the indexed keywords of a file as a dict, refreshing
+        the entry first if it was not checked yet, or if `refresh`'''
+        fname = os.path.abspath(fname)
+        if refresh or fname not in self._checked:
+            self.refresh([fname])
+        return dict((key, json.loads(value)) for key, value in self.db.execute(
+            'SELECT key, value FROM headers WHERE path = ? AND ext = ?',
+            (fname, ext)))
+
+    def get(self, fname, key, ext=0, default=None, refresh=False):
+        return self.header(fname, ext=ext, refresh=refresh).get(key, default)
+
+    def query(self, key, value=None, like=None, ext=0):
+        '''Return the files of which keyword `key` in extension `ext`
+        equals `value`, or matches the SQL pattern `like`, or exists'''
+        sql = 'SELECT path FROM headers WHERE key = ? AND ext = ?'
+        args = [key, ext]
+        if value is not None:
+            sql += ' AND text = ?'
+            args.append(str(value))
+        if like is not None:
+            sql += ' AND text LIKE ?'
+            args.append(like)
+        return sorted(p for p, in self.db.execute(sql, args))
@@ -16,6 +16,7 @@ import glob
 import copy
 from astropy.io import fits
 import re
+from .. import perf
 
 
 class SpitzerBCD(object):
@@ -56,6 +57,7 @@ class SpitzerBCD(object):
         else:
             return None
 
+    @perf.timed('discovery')
     def get_imlists(self, chan):
         print "collect files from", self.datadir
         for key in self.dkey['image']:
@@ -81,6 +83,7 @@ class SpitzerBCD(object):
         else:
             print "[!] dmask list is empty, abort"
             sys.exit(1)
+        perf.count('discovery.images', len(images))
         return images, sigmas, dmasks
 
 
@@ -97,10 +100,18 @@ def resolve_bcddir(rootdir):
     return aors
 
 
-def isscan(fname):
+@perf.timed('fits_io')
+def isscan(fname, index=None):
     '''
-     check whether an image is in scan mode
+     check whether an image is in scan mode; with a HeaderIndex the
+     keyword is looked up in the index instead of the file
     '''
+    if index is not None:
+        aot_type = index.get(fname, 'AOT_TYPE')
+        if aot_type is not None:
+            print aot_type
+            return 'Phot' not in aot_type
+        # not indexed, read the file
     hdulist = fits.open(fname)
     if 'Phot' in hdulist[0].header['AOT_TYPE']:
         print hdulist[0].header['AOT_TYPE']
@@ -173,15 +184,28 @@ class MopexConf(object):
             pmask = None
         return pmask
 
-    def compose_imglist(self, outdir, exclude=None, extra=None):
+    @perf.timed('config')
+    def compose_imglist(self, outdir, exclude=None, extra=None, cache=None):
         '''
         extra parameter helps generate additional files:
             (subdir, listname, prefix, surfix)
+        cache is an OutputCache, used to skip rewriting unchanged lists
         '''
         if not os.path.isdir(outdir):
             os.makedirs(outdir)
             print ' + {0:s}'.format(outdir)
         images, sigmas, dmasks = self.obs.get_imlists(exclude=exclude)
+        if cache is not None:
+            outfiles = [os.path.join(outdir, n) for n in (
+                'imageList.txt', 'sigmaList.txt', 'dmaskList.txt')]
+            outfiles.extend(os.path.join(outdir, e[0], e[1])
+                            for e in extra or [])
+            key = cache.fingerprint(['compose_imglist', outfiles, images,
+                                     sigmas, dmasks, extra])
+            # the lists are rewritten anyway without the cache
+            if cache.fetch(key, outfiles, clobber=True):
+                print ' = {0:s}'.format(outdir)
+                return images, sigmas, dmasks
         # write lists
         with open(os.path.join(outdir, 'imageList.txt'), 'w') as fo:
             for i in images:
@@ -204,6 +228,8 @@ class MopexConf(object):
                         fo.write(os.path.join(
                             exdir,
                             prefix + basename + suffix + '.fits\n'))
+        if cache is not None:
+            cache.store(key, outfiles)
         return images, sigmas, dmasks
 
 
@@ -254,7 +280,8 @@ class MopexNameList(object):
             else:
                 self.parameters[k] = str(v)
 
-    def dump(self, output, **kwargs):
+    @perf.timed('config')
+    def dump(self, output, cache=None, **kwargs):
         parameters = copy.deepcopy(self.parameters)
         for k, v in kwargs.items():
             if isinstance(v, dict):
@@ -270,6 +297,13 @@ class MopexNameList(object):
             else:
                 i = self._indices[k]
                 nl[i] = ' = '.join([k, v]) + '\n'
+        if cache is not None:
+            key = cache.fingerprint(['MopexNameList.dump', output, nl])
+            if cache.fetch(key, [output], clobber=True):
+                return output
         with open(output, 'w') as fo:
             fo.write(''.join(nl))
+        perf.file_bytes('config', output)
+        if cache is not None:
+            cache.store(key, [output])
         return output
@@ -53,6 +53,27 @@ class WIYNLayout(object):
         top = bottom + self.CH
         return (left, right), (bottom, top)
 
+    def get_cell_rects(self, otas):
+        '''Return the ids (ox, oy, cx, cy) and the rects (l, r, b, t) of
+        all cells of the given OTAs (list of ox * 10 + oy), as two arrays
+        of shape (N, 4)'''
+        import numpy as np
+        otas = np.asarray(otas, dtype=int)
+        cx, cy = np.meshgrid(np.arange(self.NCX), np.arange(self.NCY),
+                             indexing='ij')
+        ids = np.empty((len(otas), cx.size, 4), dtype=int)
+        ids[:, :, 0] = (otas // 10)[:, None]
+        ids[:, :, 1] = (otas % 10)[:, None]
+        ids[:, :, 2] = cx.ravel()
+        ids[:, :, 3] = cy.ravel()
+        ids = ids.reshape(-1, 4)
+        left, bottom = self.get_xy_from_oxy(
+            ids[:, 0], ids[:, 1],
+            ids[:, 2] * (self.CW + self.CGW), ids[:, 3] * (self.CH + self.CGH))
+        rects = np.column_stack(
+            [left, left + self.CW, bottom, bottom + self.CH])
+        return ids, rects
+
     def get_ota_bins(self):
         '''Return two list of tuples, for x and y direction, respectively.
         The each tuple in each list is the bound left and right global
@@ -156,6 +177,18 @@ class WIYNFact(object):
         return cls.broken_cells.get(
             str(cls.ota_id.get(int(ox * 10 + oy), 'null')), [])
 
+    @classmethod
+    def get_broken_mask(cls, ids):
+        '''Return True for the broken ones of cells (ox, oy, cx, cy)'''
+        import numpy as np
+        broken = set()
+        for ota in set(int(ox * 10 + oy) for ox, oy in ids[:, :2]):
+            for cx, cy in cls.get_broken_cells(ota // 10, ota % 10):
+                # cell y is flipped, as in make_skeleton
+                broken.add((ota // 10, ota % 10, cx, 7 - cy))
+        return np.array([tuple(i) in broken for i in ids.tolist()],
+                        dtype=bool)
+
     @classmethod
     def get_ota_xy(cls, ext):
         return cls.ota_order[ext - 1]
@@ -177,16 +210,17 @@ class WIYNFact(object):
         return os.path.join(os.path.dirname(__file__),
                             'odi_guide_ota_checker.fits')
 
-if __name__ == '__main__':
 
-    from astropy.io import fits
-    from astropy import wcs
+def make_skeleton(binning=11.0):
+    '''Return the layout and the flag image of the focal plane: 1 for ODI
+    OTAs, 3 for pODI OTAs, 0 for unused OTAs, negative for broken cells
+    and NaN in the gaps'''
     import numpy as np
 
-    wl = WIYNLayout()
+    wl = WIYNLayout(binning=binning)
     # full range 8 OTAs
     (_, right), (_, top) = wl.get_ota_rect(7, 7)
-    blank = np.ones((right + 1, top + 1)) * np.NAN
+    blank = np.ones((int(right) + 1, int(top) + 1)) * np.NAN
     for ox in range(0, 8):
         for oy in range(0, 8):
             flag = 0  # not used flag 0
@@ -204,24 +238,38 @@ if __name__ == '__main__':
                         _flag = -flag
                     else:
                         _flag = flag
-                    blank[cell_bottom:cell_top, cell_left:cell_right] = _flag
+                    blank[int(cell_bottom):int(cell_top),
+                          int(cell_left):int(cell_right)] = _flag
+    return wl, blank
+
+
+def make_skeleton_header(wl, shape, tra=14.79625, tdec=-1.23363888889):
+    '''Return the TAN wcs header of the skeleton image, centered on
+    OTA 33'''
+    from astropy import wcs
+
+    w = wcs.WCS(naxis=2)
+    # w.wcs.crpix = [shape[0] / 2, shape[1] / 2]
+    ccol, crow = wl.get_xy_from_oxy(3, 3, wl.OW / 2.0, wl.OH / 2.0)
+    w.wcs.crpix = [shape[1] - ccol, crow]
+    w.wcs.crval = [tra,  tdec]
+    w.wcs.cd = [(wl.ps / 3600., 0), (0, wl.ps / 3600.)]
+    w.wcs.ctype = ["RA---TAN", "DEC--TAN"]
+    return w.to_header()
+
+
+if __name__ == '__main__':
+
+    from astropy.io import fits
+
+    wl, blank = make_skeleton()
     # east to the left
     # blank = np.fliplr(blank)
     # import matplotlib.pyplot as plt
     # plt.imshow(blank, aspect='equal', interpolation='none')
     # plt.show()
     # add wcs
-    w = wcs.WCS(naxis=2)
-    # w.wcs.crpix = [blank.shape[0] / 2, blank.shape[1] / 2]
-    ccol, crow = wl.get_xy_from_oxy(3, 3, wl.OW / 2.0, wl.OH / 2.0)
-    w.wcs.crpix = [blank.shape[1]-ccol, crow]
-    # crval
-    tra = 14.79625
-    tdec = -1.23363888889
-    w.wcs.crval = [tra,  tdec]
-    w.wcs.cd = [(wl.ps / 3600., 0), (0, wl.ps / 3600.)]
-    w.wcs.ctype = ["RA---TAN", "DEC--TAN"]
-    header = w.to_header()
+    header = make_skeleton_header(wl, blank.shape)
     # create fits file
     outfname = 'wiyn_skeleton.fits'
     hdu = fits.PrimaryHDU(blank, header=header)
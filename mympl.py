@@ -8,29 +8,58 @@
 mympl.py
 
 Provide Jerry's matplotlib style (v1) and relevant utility functions
+
+Importing this module has no side effect: matplotlib is only imported when
+needed, and the style is applied with `use_style`, within `with style():`,
+or by the first canvas created.
+
+Text is typeset with LaTeX, the renderings are kept in a shared, size
+bounded cache (MYMPL_TEXCACHE, MYMPL_TEXCACHE_SIZE in MB). Canvases in draft
+mode, or all of them when MYMPL_DRAFT=1, use mathtext instead.
 """
 
 
 from __future__ import division
 import os
 import sys
+import copy
+import time
 import logging
-from cycler import cycler
-import matplotlib
-import matplotlib.style
-import matplotlib.pyplot as plt
-import matplotlib.colors as mc
-from matplotlib import gridspec
+from contextlib import contextmanager
 # import subprocess
 from math import sqrt, ceil
 import numpy as np
 # import matplotlib.patches as mpatches
 
-from matplotlib import rc
 from functools import reduce
+from . import perf
 
 NAME = "MYMPL"
 
+try:
+    _string_types = basestring
+except NameError:  # python 3
+    _string_types = str
+
+DRAFT = os.environ.get('MYMPL_DRAFT', '0').lower() not in ('', '0', 'false')
+# rc params of the draft canvases, applied when they are drawn
+DRAFT_RC = {
+    'text.usetex': False,
+    'mathtext.fontset': 'cm',
+    'font.serif': ['DejaVu Serif'],
+    }
+# the dash of TexStyle needs amsmath, which mathtext does not have
+TEX_DASH = r'\text{--}'
+MATHTEXT_DASH = '{-}'
+
+logging.getLogger(NAME).addHandler(logging.NullHandler())
+
+
+def _pyplot():
+    '''import pyplot on first use'''
+    import matplotlib.pyplot as plt
+    return plt
+
 
 def font_settings(**kwargs):
     settings = {
@@ -52,15 +81,19 @@ def font_settings(**kwargs):
 
 emulateapj = '/home/ma/Codes/writing/HerschelQuasar/herschelquasar.width'
 LATEX_INCHES_PER_PT = 1.0 / 72.27
+VECTOR_FORMATS = ('pdf', 'eps', 'ps', 'svg', 'svgz', 'pgf')
 
 
 class CanvasBase(object):
     '''Base class for providing quick layout/sizing'''
 
     inches_per_pt = LATEX_INCHES_PER_PT
+    scatter_threshold = 100000
+    rasterize_threshold = 10000
 
     def __init__(self, width=None, aspect=0.618, scale=1, usetw=False,
-                 fontsize=12, family='serif', projection=None):
+                 fontsize=12, family='serif', projection=None, style=True,
+                 draft=None, pyplot=True, pool=None):
         '''
         width:
             parse a latex size configure file, set the width of figure
@@ -71,10 +104,35 @@ class CanvasBase(object):
             scale to apply to the set dem parameter
         usetw:
             use text width as the figure width if True, otherwise colwidth
+        style:
+            apply the style first if it is not yet in effect
+        draft:
+            render text with mathtext instead of LaTeX, for quick
+            iterations; default to MYMPL_DRAFT. The rc params are only
+            changed while the canvas is drawn, see `rc_context`
+        pyplot:
+            register the figure in pyplot; otherwise it is a bare Figure
+            with an Agg canvas, freed with the canvas
+        pool:
+            take a cleared figure of the same size from a FigurePool
+            (True for the shared one), returned by `close`
+
+        Use the canvas as a context manager, or call `close`, to free
+        the figure.
         '''
         self.logger = logging.getLogger(NAME)
+        if style and not _style_state['applied']:
+            use_style()
+        self.draft = DRAFT if draft is None else draft
+        self.rc = dict(DRAFT_RC) if self.draft else {}
         self.init_mplrc(width, aspect, scale, usetw, fontsize, family)
-        self.fig = plt.figure()
+        self.pool = figure_pool if pool is True else pool
+        if self.pool is not None:
+            self.fig = self.pool.acquire(pyplot=pyplot)
+        elif pyplot:
+            self.fig = _pyplot().figure()
+        else:
+            self.fig = _bare_figure()
         self.axes = []
         self.ax_keys = {}
         if projection is not None:
@@ -83,8 +141,47 @@ class CanvasBase(object):
     def parts(self):
         return self.fig, self.axes
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    @contextmanager
+    def rc_context(self):
+        '''Apply the rc params of the canvas within the block; the
+        figure is drawn in it. Text is laid out at draw time, but takes
+        `usetex` when created, so that of a draft canvas is reset here'''
+        import matplotlib
+        with matplotlib.rc_context(self.rc):
+            if self.draft and self.fig is not None:
+                self.draft_texts()
+            yield
+
+    def draft_texts(self):
+        '''Set the texts of the figure for mathtext'''
+        from matplotlib.text import Text
+        for text in self.fig.findobj(Text):
+            text.set_usetex(False)
+            label = text.get_text()
+            if TEX_DASH in label:
+                text.set_text(label.replace(TEX_DASH, MATHTEXT_DASH))
+
+    def close(self):
+        '''Free the figure, or return it to the pool'''
+        if self.fig is None:
+            return
+        if self.pool is not None:
+            self.pool.release(self.fig)
+        else:
+            _close_figure(self.fig)
+        self.fig = None
+        self.axes = []
+
     def init_mplrc(self, width, aspect, scale, usetw, fontsize, family):
 
+        from matplotlib import rc
         if isinstance(width, str):
             with open(width) as fo:
                 col_width_pt, font_size_pt, text_width_pt = [
@@ -106,11 +203,16 @@ class CanvasBase(object):
         self.logger.info(
             'figure size: {0:.1f}in by {1:.1f}in ({2:.0f}x{3:.0f})'.format(
                 fig_width, fig_height, fig_width_pt, fig_width_pt * aspect))
+        self.font_size_pt = font_size_pt
+        # unchanged since the last canvas
+        key = (fig_width, fig_height, font_size_pt, family)
+        if _style_state.get('mplrc') == key:
+            return
         rc('font', **font_settings(family=family, size=font_size_pt))
         rc('legend', fontsize=font_size_pt)
         rc('figure',
            figsize=(fig_width, fig_height), dpi=1 / self.inches_per_pt)
-        self.font_size_pt = font_size_pt
+        _style_state['mplrc'] = key
 
     def save_or_show(self, savename,
                      bbox_inches='tight',
@@ -132,21 +234,164 @@ class CanvasBase(object):
                         save = True
                     else:
                         save = False
-        if isinstance(pad_inches, str) and pad_inches[-2:].lower() == 'em':
-            pad_inches = float(pad_inches[:-2]) * \
-                    self.font_size_pt * self.inches_per_pt
-        else:
-            pad_inches = float(pad_inches)
         if save:
-            self.fig.savefig(
-                savename,
-                bbox_inches=bbox_inches,
-                pad_inches=pad_inches,
-                dpi='figure',
-                format=os.path.splitext(savename)[-1][1:], **kwargs)
-            self.logger.info('figure saved: {0}'.format(savename))
+            self.save(savename, bbox_inches=bbox_inches,
+                      pad_inches=pad_inches, **kwargs)
         else:
-            plt.show()
+            with self.rc_context():
+                _pyplot().show()
+
+    def pad_inches(self, pad_inches):
+        '''Convert padding given in em (e.g. '0.2em') to inches'''
+        if isinstance(pad_inches, str) and pad_inches[-2:].lower() == 'em':
+            return float(pad_inches[:-2]) * \
+                    self.font_size_pt * self.inches_per_pt
+        return float(pad_inches)
+
+    def save(self, savename, bbox_inches='tight', pad_inches='0.2em',
+             rasterize=None, raster_dpi=300, **kwargs):
+        '''Save figure with given name.
+
+        rasterize:
+            in vector formats, rasterize at `raster_dpi` the artists with
+            more elements than this (default `rasterize_threshold`, False
+            to keep everything vector); text and axes stay vector
+        '''
+        fmt = os.path.splitext(savename)[-1][1:]
+        dpi = 'figure'
+        heavy = []
+        if fmt.lower() in VECTOR_FORMATS and rasterize is not False:
+            heavy = self.rasterize_heavy(rasterize)
+            if heavy:
+                dpi = raster_dpi
+        t0 = time.time()
+        try:
+            with perf.timer('plot.save'), self.rc_context():
+                self.fig.savefig(
+                    savename,
+                    bbox_inches=bbox_inches,
+                    pad_inches=self.pad_inches(pad_inches),
+                    dpi=dpi,
+                    format=fmt, **kwargs)
+        finally:
+            for artist in heavy:
+                artist.set_rasterized(False)
+        perf.file_bytes('plot', savename)
+        self.logger.info(
+            'figure saved: {0} ({1:.1f}kB in {2:.2f}s{3})'.format(
+                savename, os.path.getsize(savename) / 1024.,
+                time.time() - t0,
+                ', {0:d} rasterized'.format(len(heavy)) if heavy else ''))
+        return savename
+
+    def rasterize_heavy(self, threshold=None):
+        '''Mark the artists with more than `threshold` elements (points,
+        paths, pixels, or patches of one axes) as rasterized; return
+        them'''
+        from matplotlib.lines import Line2D
+        from matplotlib.collections import Collection
+        from matplotlib.image import AxesImage
+        from matplotlib.patches import Patch
+        if threshold is None:
+            threshold = self.rasterize_threshold
+        heavy = []
+        for ax in self.fig.axes:
+            patches = []
+            for artist in ax.get_children():
+                if artist.get_rasterized() or not artist.get_visible():
+                    continue
+                if isinstance(artist, Line2D):
+                    n = len(artist.get_xdata())
+                elif isinstance(artist, Collection):
+                    n = max(len(artist.get_offsets()),
+                            len(artist.get_paths()))
+                elif isinstance(artist, AxesImage):
+                    a = artist.get_array()
+                    n = 0 if a is None else a.shape[0] * a.shape[1]
+                elif isinstance(artist, Patch) and artist is not ax.patch:
+                    patches.append(artist)
+                    continue
+                else:
+                    continue
+                if n > threshold:
+                    heavy.append(artist)
+            if len(patches) > threshold:
+                heavy.extend(patches)
+        for artist in heavy:
+            artist.set_rasterized(True)
+        return heavy
+
+    def scatter(self, ax, x, y, threshold=None, bins=200, min_count=4,
+                color=None, extent=None, **kwargs):
+        '''Scatter plot that turns into a 2D histogram image above
+        `threshold` points (default `scatter_threshold`). Points in bins
+        with less than `min_count` of them are kept as markers. The color
+        is the next one of the axes cycle unless given.
+
+        Return the image (None below the threshold) and the markers'''
+        import matplotlib.colors as mc
+        import matplotlib.transforms as mtransforms
+        if threshold is None:
+            threshold = self.scatter_threshold
+        x = np.asarray(x, dtype=float).ravel()
+        y = np.asarray(y, dtype=float).ravel()
+        good = np.isfinite(x) & np.isfinite(y)
+        if extent is not None:
+            x0, x1, y0, y1 = extent
+            good &= (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+        if not good.all():
+            x, y = x[good], y[good]
+        if color is None:
+            color = ax._get_lines.get_next_color()
+        kwargs.setdefault('marker', '.')
+        kwargs.setdefault('linestyle', 'none')
+        if len(x) <= threshold:
+            return None, ax.plot(x, y, color=color, **kwargs)[0]
+        if extent is None:
+            extent = x.min(), x.max(), y.min(), y.max()
+        # pad a zero-width range the way set_xlim does
+        x0, x1 = mtransforms.nonsingular(*extent[:2], expander=0.05)
+        y0, y1 = mtransforms.nonsingular(*extent[2:], expander=0.05)
+        extent = x0, x1, y0, y1
+        nx, ny = (bins, bins) if np.isscalar(bins) else bins
+        # bin index by arithmetic, much faster than histogram2d; in place
+        # to save the allocations
+        ij = self._bin_index(x, x0, x1, nx)
+        iy = self._bin_index(y, y0, y1, ny)
+        iy *= nx
+        ij += iy
+        del iy
+        counts = np.bincount(ij, minlength=nx * ny)
+        sparse = counts[ij] < min_count
+        image = np.ma.masked_less(counts.reshape(ny, nx), min_count)
+        im = ax.imshow(image, origin='lower', extent=extent, aspect='auto',
+                       interpolation='nearest', cmap=density_cmap(color),
+                       norm=mc.LogNorm(vmin=min_count,
+                                       vmax=max(image.max(), min_count + 1)))
+        points = ax.plot(x[sparse], y[sparse], color=color, **kwargs)[0]
+        self.logger.debug('density scatter: {0:d} points, {1:d} kept'.format(
+            len(x), int(sparse.sum())))
+        return im, points
+
+    def show_fits(self, ax, fname, ext=0, **kwargs):
+        '''Display a large FITS image with a TiledImage'''
+        pyramid_keys = dict((k, kwargs.pop(k)) for k in
+                            ('cachedir', 'min_size', 'max_size')
+                            if k in kwargs)
+        return TiledImage(ax, ImagePyramid(fname, ext=ext, **pyramid_keys),
+                          **kwargs)
+
+    def live(self, artists, min_interval=0.2):
+        '''Return a LiveView that redraws `artists` in place'''
+        return LiveView(self, artists, min_interval=min_interval)
+
+    @staticmethod
+    def _bin_index(v, v0, v1, n):
+        f = v - v0
+        f *= n / (v1 - v0)
+        i = f.astype(np.intp)
+        del f
+        return np.minimum(i, n - 1, out=i)
 
     @staticmethod
     def let_dummy(ax, tick=True):
@@ -165,6 +410,71 @@ class CanvasBase(object):
         ax.patch.set_visible(False)
 
 
+def _bare_figure():
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _close_figure(fig):
+    # no pyplot, no figure registered there
+    if 'matplotlib.pyplot' in sys.modules:
+        _pyplot().close(fig)
+    fig.clf()
+
+
+class FigurePool(object):
+    '''
+    Cleared figures kept for reuse, by size, dpi and whether pyplot has
+    them; at most `maxsize` of each.
+    '''
+
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self.figures = {}
+
+    @staticmethod
+    def _key(fig, pyplot):
+        return (tuple(fig.get_size_inches()), fig.dpi, pyplot)
+
+    def acquire(self, pyplot=True):
+        '''Return a figure of the size and dpi of the rc params'''
+        import matplotlib
+        key = (tuple(matplotlib.rcParams['figure.figsize']),
+               matplotlib.rcParams['figure.dpi'], pyplot)
+        free = self.figures.get(key)
+        if free:
+            return free.pop()
+        fig = _pyplot().figure() if pyplot else _bare_figure()
+        fig._mympl_pyplot = pyplot
+        return fig
+
+    def release(self, fig):
+        '''Clear `fig` and keep it, or free it if there are enough'''
+        import matplotlib
+        pyplot = getattr(fig, '_mympl_pyplot', True)
+        free = self.figures.setdefault(self._key(fig, pyplot), [])
+        if len(free) >= self.maxsize:
+            _close_figure(fig)
+            return
+        fig.clf()
+        fig.subplots_adjust(**dict(
+            (k, matplotlib.rcParams['figure.subplot.' + k]) for k in
+            ('left', 'right', 'bottom', 'top', 'wspace', 'hspace')))
+        free.append(fig)
+
+    def clear(self):
+        for free in self.figures.values():
+            for fig in free:
+                _close_figure(fig)
+        self.figures = {}
+
+
+figure_pool = FigurePool()
+
+
 class CanvasOne(CanvasBase):
 
     def __init__(self, **kwargs):
@@ -176,6 +486,7 @@ class CanvasOne(CanvasBase):
 class CanvasTwo(CanvasOne):
     def __init__(self, ratio=[1, 1], direction='h', share='auto', space=None,
                  **kwargs):
+        from matplotlib import gridspec
         super(CanvasTwo, self).__init__(**kwargs)
         # let it be the placeholder for shared axis labels
         self.let_dummy(self.axes[0], tick=False)
@@ -216,6 +527,7 @@ class CanvasTwo(CanvasOne):
 class CanvasN(CanvasBase):
     def __init__(self, ngrid=1, tile=None, share='xy', hide_inner_tick='',
                  wspace=0.02, hspace=0.02, hide_last_tick=False, **kwargs):
+        from matplotlib import gridspec
         super(CanvasN, self).__init__(**kwargs)
         ax = self.fig.add_subplot(1, 1, 1)
         self.axes.append(ax)
@@ -245,6 +557,7 @@ class CanvasN(CanvasBase):
                         [[i] * ncol for i in range(nrow, 0, -1)])
         self.fig.subplots_adjust(left=0.05, right=0.97, bottom=0.08, top=0.97,
                                  wspace=wspace, hspace=hspace)
+        gs = gridspec.GridSpec(nrow, ncol)
         bxes = []
         for i in range(0, ngrid):
             if xshare[i] is not None:
@@ -252,22 +565,24 @@ class CanvasN(CanvasBase):
             if yshare[i] is not None:
                 yshare[i] = bxes[yshare[i]]
             ax_keys = {k: v[i] for k, v in self.ax_keys.items()}
+            # shared axes use the locators and formatters of the first
             bxes.append(
-                self.fig.add_subplot(nrow, ncol, i + 1,
+                self.fig.add_subplot(gs[i // ncol, i % ncol],
                                      sharex=xshare[i],
                                      sharey=yshare[i],
                                      zorder=zorder[i],
                                      **ax_keys))
-            # remove the first and last label if share
+            # remove the first and last label if share; tick_params holds
+            # for ticks created later, so no tick is made here
             if 'x' in share or 'x' in hide_inner_tick:
-                matplotlib.artist.setp(
-                    bxes[-1].get_xticklabels(), visible=xtickvis[i])
+                if not xtickvis[i]:
+                    bxes[-1].tick_params(axis='x', labelbottom=False)
                 if hide_last_tick and xtickadj[i]:
                     xticks = bxes[-1].xaxis.get_major_ticks()
                     xticks[-1].label1.set_visible(False)
             if 'y' in share or 'y' in hide_inner_tick:
-                matplotlib.artist.setp(
-                    bxes[-1].get_yticklabels(), visible=ytickvis[i])
+                if not ytickvis[i]:
+                    bxes[-1].tick_params(axis='y', labelleft=False)
                 if hide_last_tick and ytickadj[i]:
                     yticks = bxes[-1].yaxis.get_major_ticks()
                     yticks[-1].label1.set_visible(False)
@@ -281,6 +596,473 @@ class CanvasN(CanvasBase):
         self.ytickadj = yshare
 
 
+class CanvasMosaic(CanvasOne):
+    '''Focal plane drawn as one collection of rects (l, r, b, t), one
+    per chip or cell, colored by value. Broken ones are masked and shaded
+    with the bad color of the colormap'''
+
+    def __init__(self, rects, values=None, broken=None, cmap='viridis',
+                 vmin=None, vmax=None, colorbar=True, bad=None, **kwargs):
+        from matplotlib import cm
+        from matplotlib.collections import PolyCollection
+        super(CanvasMosaic, self).__init__(**kwargs)
+        rects = np.asarray(rects, dtype=float)
+        l, r, b, t = rects.T
+        verts = np.stack([np.column_stack(c) for c in
+                          [(l, b), (r, b), (r, t), (l, t)]], axis=1)
+        self.broken = np.zeros(len(rects), dtype=bool) \
+            if broken is None else np.asarray(broken, dtype=bool)
+        # a copy, not to change the bad color of the registered one
+        cmap = copy.copy(cm.get_cmap(cmap))
+        cmap.set_bad(bad or SolarizedColor.base1)
+        ax = self.axes[0]
+        self.collection = PolyCollection(verts, cmap=cmap, edgecolors='none')
+        self.collection.set_clim(vmin, vmax)
+        self.update(np.zeros(len(rects)) if values is None else values)
+        ax.add_collection(self.collection)
+        ax.set_xlim(l.min(), r.max())
+        ax.set_ylim(b.min(), t.max())
+        ax.set_aspect('equal')
+        if colorbar:
+            self.colorbar = self.fig.colorbar(self.collection, ax=ax)
+
+    def update(self, values, autoscale=False):
+        '''Set the value of each rect, in place'''
+        values = np.ma.masked_invalid(np.asarray(values, dtype=float))
+        values[self.broken] = np.ma.masked
+        self.collection.set_array(values)
+        if autoscale or self.collection.norm.vmin is None:
+            self.collection.autoscale()
+        return self.collection
+
+    @classmethod
+    def wiyn(cls, values=None, otas=None, binning=11.0, **kwargs):
+        '''Cells of WIYN ODI OTAs (default all of them), in the order of
+        the `ids` attribute (ox, oy, cx, cy)'''
+        from .instrument.wiyn import WIYNLayout, WIYNFact
+        if otas is None:
+            otas = sorted(WIYNFact.ota_id)
+        ids, rects = WIYNLayout(binning=binning).get_cell_rects(otas)
+        kwargs.setdefault('broken', WIYNFact.get_broken_mask(ids))
+        canvas = cls(rects, values=values, **kwargs)
+        canvas.ids = ids
+        return canvas
+
+    @classmethod
+    def cfht(cls, values=None, gap=(80, 80), **kwargs):
+        '''Chips of CFHT MegaCam, in extension order'''
+        from .instrument import cfht
+        return cls(cfht.get_chip_rects(gap=gap), values=values, **kwargs)
+
+
+class LiveView(object):
+    '''
+    Redraw the artists of a canvas as their data change, by blitting them
+    onto the cached background of their axes. Artists are updated in
+    place (set_data, set_array, CanvasMosaic.update, ...) then
+    `refresh` is called with the changed ones.
+
+        view = canvas.live([line])
+        view.start()
+        for frame in frames:
+            line.set_ydata(qa(frame))
+            view.refresh([line])
+
+    min_interval:
+        refresh at most this often (seconds); changes in between are
+        drawn by the next refresh, or by `flush`
+
+    The artists are animated, hence left out of savefig, until `stop`.
+    '''
+
+    def __init__(self, canvas, artists, min_interval=0.2):
+        self.canvas = canvas
+        self.fig = canvas.fig
+        self.artists = list(artists)
+        self.min_interval = min_interval
+        self.backgrounds = {}
+        self._changed = set()
+        self._last = 0
+        for artist in self.artists:
+            # left out of full draws, so they are not in the backgrounds
+            artist.set_animated(True)
+        self._cid = self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def start(self, show=True):
+        '''Draw the figure once, and show it without blocking'''
+        if show:
+            _pyplot().show(block=False)
+        self.redraw()
+        return self
+
+    def stop(self):
+        self.fig.canvas.mpl_disconnect(self._cid)
+        for artist in self.artists:
+            artist.set_animated(False)
+
+    def _on_draw(self, event):
+        # the figure canvas may be replaced when the window opens
+        canvas = self.fig.canvas
+        self.backgrounds = dict(
+            (ax, canvas.copy_from_bbox(ax.bbox))
+            for ax in set(a.axes for a in self.artists))
+        for artist in self.artists:
+            artist.axes.draw_artist(artist)
+        self._changed.clear()
+
+    def redraw(self):
+        '''Full draw, needed when limits, labels or the size change'''
+        with self.canvas.rc_context():
+            self.fig.canvas.draw()
+        self._last = time.time()
+
+    def refresh(self, artists=None, force=False):
+        '''Blit the axes of the changed `artists` (default all). Return
+        False if skipped to keep to `min_interval`'''
+        self._changed.update(self.artists if artists is None else artists)
+        now = time.time()
+        if not force and now - self._last < self.min_interval:
+            return False
+        if not self.backgrounds:
+            self.redraw()
+            return True
+        import matplotlib
+        canvas = self.fig.canvas
+        with matplotlib.rc_context(self.canvas.rc):
+            for ax in set(a.axes for a in self._changed):
+                canvas.restore_region(self.backgrounds[ax])
+                # everything animated in the axes, the restore erased it
+                for artist in self.artists:
+                    if artist.axes is ax:
+                        ax.draw_artist(artist)
+                canvas.blit(ax.bbox)
+        canvas.flush_events()
+        self._changed.clear()
+        self._last = now
+        return True
+
+    def flush(self):
+        '''Draw the changes held back by the rate limit'''
+        if self._changed:
+            self.refresh([], force=True)
+
+
+def zscale(data, nsample=1000, contrast=0.25, krej=2.5, niter=5,
+           seed=0, run=50):
+    '''Return the IRAF zscale display limits of `data` (an array or a
+    memmap), from `nsample` pixels picked at random in runs of `run`
+    consecutive ones, so that a memmap is read in a few places only'''
+    rng = np.random.RandomState(seed)
+    run = min(run, data.size)
+    starts = np.sort(rng.randint(0, data.size - run + 1,
+                                 max(nsample // run, 1)))
+    idx = (starts[:, None] + np.arange(run)).ravel()
+    sample = np.asarray(data.reshape(-1)[idx], dtype=float)
+    sample = np.sort(sample[np.isfinite(sample)])
+    npix = len(sample)
+    if npix == 0:
+        return 0., 1.
+    vmin, vmax = sample[0], sample[-1]
+    center = (npix - 1) // 2
+    median = sample[center]
+    x = np.arange(npix)
+    good = np.ones(npix, dtype=bool)
+    slope = 0.
+    for _ in range(niter):
+        if good.sum() < max(5, npix // 2):
+            break
+        slope, icept = np.polyfit(x[good], sample[good], 1)
+        resid = sample - (slope * x + icept)
+        sigma = resid[good].std()
+        newgood = np.abs(resid) < krej * sigma
+        if (newgood == good).all():
+            break
+        good = newgood
+    slope /= contrast
+    return (max(vmin, median - center * slope),
+            min(vmax, median + (npix - 1 - center) * slope))
+
+
+class ImagePyramid(object):
+    '''
+    Levels of an image downsampled by 2, 4, 8... (mean of the finite
+    pixels) down to `min_size`, built once from the memory mapped FITS
+    data in row chunks and kept as .npy files in `cachedir` (default
+    MYMPL_PYRAMID, or ~/.cache/pyjerry/pyramid). The least recently used
+    levels are dropped when the cache takes more than `max_size` MB
+    (default MYMPL_PYRAMID_SIZE, or 2048). Level 0 is the FITS data
+    itself.
+    '''
+
+    def __init__(self, fname, ext=0, cachedir=None, min_size=512,
+                 chunk=256, max_size=None):
+        from astropy.io import fits
+        from .cache import fingerprint, prune_dir
+        self.logger = logging.getLogger(NAME)
+        self.fname = fname
+        self.hdulist = fits.open(fname, memmap=True)
+        self.data = self.hdulist[ext].data
+        if self.data is None or self.data.ndim != 2:
+            raise ValueError('no 2D image in {0}[{1}]'.format(fname, ext))
+        cachedir = cachedir or os.environ.get('MYMPL_PYRAMID') or \
+            os.path.expanduser('~/.cache/pyjerry/pyramid')
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+        key = fingerprint(['pyramid', ext, min_size], files=[fname])
+        self.levels = [self.data]
+        built = False
+        while max(self.levels[-1].shape) > min_size:
+            lname = os.path.join(cachedir, '{0}_{1:d}.npy'.format(
+                key, len(self.levels)))
+            if os.path.isfile(lname):
+                # mark as used, atime is not reliable
+                os.utime(lname, None)
+            else:
+                self._downsample(self.levels[-1], lname, chunk)
+                built = True
+            self.levels.append(np.load(lname, mmap_mode='r'))
+        if built:
+            # the cache only grows here
+            if max_size is None:
+                max_size = float(os.environ.get('MYMPL_PYRAMID_SIZE', 2048))
+            freed = prune_dir(cachedir, max_size * 1024 ** 2)
+            if freed:
+                self.logger.info('pyramid cache: freed {0:.1f}MB'.format(
+                    freed / 1024. ** 2))
+
+    def close(self):
+        self.levels = []
+        self.data = None
+        self.hdulist.close()
+
+    def _downsample(self, src, lname, chunk):
+        with perf.timer('plot.pyramid'):
+            h, w = src.shape
+            tmp = '{0}.{1:d}.npy'.format(lname[:-4], os.getpid())
+            out = np.lib.format.open_memmap(
+                tmp, mode='w+', dtype='f4', shape=((h + 1) // 2, (w + 1) // 2))
+            for r in range(0, out.shape[0], chunk):
+                block = np.asarray(src[2 * r:2 * (r + chunk)], dtype='f4')
+                nr = (block.shape[0] + 1) // 2
+                pad = np.full((2 * nr, 2 * out.shape[1]), np.nan, dtype='f4')
+                pad[:block.shape[0], :w] = block
+                pad = pad.reshape(nr, 2, out.shape[1], 2)
+                good = np.isfinite(pad)
+                total = np.where(good, pad, 0).sum(axis=(1, 3))
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    out[r:r + nr] = total / good.sum(axis=(1, 3))
+            out.flush()
+            del out
+            os.rename(tmp, lname)
+        self.logger.debug('pyramid level: {0}'.format(lname))
+
+    def level_for(self, scale):
+        '''Return the coarsest level that still has a pixel per screen
+        pixel, when `scale` image pixels fall on one screen pixel'''
+        k = int(np.floor(np.log2(max(scale, 1.))))
+        return min(k, len(self.levels) - 1)
+
+
+class TiledImage(object):
+    '''
+    Show an ImagePyramid on `ax`, drawing only the part of the level
+    that matches the current view and figure dpi. The view is updated
+    when the axes limits change; the crop is aligned to `tile` pixels so
+    that small pans reuse it.
+    '''
+
+    def __init__(self, ax, pyramid, tile=256, vmin=None, vmax=None,
+                 **kwargs):
+        self.ax = ax
+        self.pyramid = pyramid
+        self.tile = tile
+        if vmin is None or vmax is None:
+            zmin, zmax = zscale(pyramid.data)
+            vmin = zmin if vmin is None else vmin
+            vmax = zmax if vmax is None else vmax
+        kwargs.setdefault('cmap', 'gray')
+        kwargs.setdefault('interpolation', 'nearest')
+        self.view = None
+        h, w = pyramid.data.shape
+        self.image = ax.imshow(
+            np.zeros((1, 1), dtype='f4'), origin='lower', vmin=vmin,
+            vmax=vmax, extent=(-0.5, w - 0.5, -0.5, h - 0.5), **kwargs)
+        ax.set_xlim(-0.5, w - 0.5)
+        ax.set_ylim(-0.5, h - 0.5)
+        self.update()
+        ax.callbacks.connect('xlim_changed', self.update)
+        ax.callbacks.connect('ylim_changed', self.update)
+
+    def update(self, *args):
+        '''Load the level and crop for the current view'''
+        h, w = self.pyramid.data.shape
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        bbox = self.ax.bbox
+        k = self.pyramid.level_for(max((x1 - x0) / max(bbox.width, 1),
+                                       (y1 - y0) / max(bbox.height, 1)))
+        f = 2 ** k
+        level = self.pyramid.levels[k]
+        t = self.tile
+        c0 = max(int(x0 / f) // t * t, 0)
+        r0 = max(int(y0 / f) // t * t, 0)
+        c1 = min((int(x1 / f) // t + 1) * t, level.shape[1])
+        r1 = min((int(y1 / f) // t + 1) * t, level.shape[0])
+        view = (k, r0, r1, c0, c1)
+        if view == self.view:
+            return
+        self.view = view
+        with perf.timer('plot.tiles'):
+            self.image.set_data(np.asarray(level[r0:r1, c0:c1]))
+        self.image.set_extent((c0 * f - 0.5, min(c1 * f, w) - 0.5,
+                               r0 * f - 0.5, min(r1 * f, h) - 0.5))
+
+
+class PlotJob(object):
+    '''
+    A figure of a batch: `draw(canvas, *args)` on a `canvas` class
+    instance created with `canvas_kwargs`, saved to `savename`.
+
+    `draw` and `args` are sent to worker processes, so they need to be
+    picklable: module level functions, not lambdas.
+    '''
+
+    def __init__(self, draw, savename=None, canvas=CanvasOne, args=(),
+                 **canvas_kwargs):
+        self.draw = draw
+        self.savename = savename
+        self.canvas = canvas
+        self.args = tuple(args)
+        self.canvas_kwargs = canvas_kwargs
+
+    def make(self):
+        canvas = self.canvas(**self.canvas_kwargs)
+        self.draw(canvas, *self.args)
+        return canvas
+
+
+def _batch_init():
+    _pyplot().switch_backend('agg')
+    perf.worker_init()
+
+
+def _render_job(task):
+    return perf.worker_result(_render_one(*task))
+
+
+def _render_one(job, kwargs, savename):
+    # saved to savename, or the figure is sent back to be saved
+    canvas = job.make()
+    try:
+        if savename is not None:
+            return canvas.save(savename, **kwargs)
+        kwargs = dict(kwargs)
+        kwargs['pad_inches'] = canvas.pad_inches(
+            kwargs.get('pad_inches', '0.2em'))
+        raster_dpi = kwargs.pop('raster_dpi', 300)
+        rasterize = kwargs.pop('rasterize', None)
+        if rasterize is not False and canvas.rasterize_heavy(rasterize):
+            kwargs['dpi'] = raster_dpi
+        kwargs.setdefault('bbox_inches', 'tight')
+        if canvas.draft:
+            canvas.draft_texts()
+        return canvas.fig, kwargs, canvas.rc
+    finally:
+        if savename is None:
+            # detached from pyplot, it unpickles as a bare figure
+            _pyplot().close(canvas.fig)
+        else:
+            canvas.close()
+
+
+def _pdf_merger():
+    '''Return the class joining pdf files of pypdf or PyPDF2, or None'''
+    try:
+        from pypdf import PdfWriter
+        return PdfWriter
+    except ImportError:
+        pass
+    try:
+        from PyPDF2 import PdfMerger
+        return PdfMerger
+    except ImportError:
+        pass
+    try:
+        from PyPDF2 import PdfFileMerger
+        return PdfFileMerger
+    except ImportError:
+        return None
+
+
+def render_batch(jobs, output=None, nproc=None, **kwargs):
+    '''Render `jobs` on `nproc` processes with the Agg backend.
+
+    Each job is saved to its own savename, or, with `output`, all of them
+    go in order to the pages of that multi-page pdf. The pages are
+    rendered by the workers as single page pdfs, then joined with pypdf
+    or PyPDF2; without either, the workers only build the figures and
+    the pages are drawn one by one here, each with the rc params of its
+    canvas. `kwargs` go to `CanvasBase.save`. Return the files written'''
+    import shutil
+    import tempfile
+    from multiprocessing import Pool, cpu_count
+    jobs = list(jobs)
+    topdf = output is not None
+    if not topdf and any(job.savename is None for job in jobs):
+        raise ValueError('jobs need a savename without output')
+    if not jobs:
+        return []
+    nproc = min(nproc or cpu_count(), len(jobs))
+    logger = logging.getLogger(NAME)
+    logger.info('render {0:d} figures on {1:d} processes'.format(
+        len(jobs), nproc))
+    merger = _pdf_merger() if topdf else None
+    pagedir = None
+    if not topdf:
+        savenames = [job.savename for job in jobs]
+    elif merger is not None:
+        pagedir = tempfile.mkdtemp(prefix='mympl_pages_')
+        savenames = [os.path.join(pagedir, '{0:06d}.pdf'.format(i))
+                     for i in range(len(jobs))]
+    else:
+        logger.warning('no pypdf or PyPDF2, draw the pages serially')
+        savenames = [None] * len(jobs)
+    pool = Pool(nproc, _batch_init)
+    try:
+        results = perf.merge_results(pool.imap(
+            _render_job, [(job, kwargs, savename)
+                          for job, savename in zip(jobs, savenames)]))
+        if not topdf:
+            return list(results)
+        if merger is not None:
+            pages = list(results)
+            with perf.timer('plot.merge'):
+                pdf = merger()
+                try:
+                    for page in pages:
+                        pdf.append(page)
+                    with open(output, 'wb') as fo:
+                        pdf.write(fo)
+                finally:
+                    pdf.close()
+        else:
+            import matplotlib
+            from matplotlib.backends.backend_pdf import PdfPages
+            with perf.timer('plot.save'):
+                with PdfPages(output) as pdf:
+                    for fig, save_kwargs, rc in results:
+                        with matplotlib.rc_context(rc):
+                            pdf.savefig(fig, **save_kwargs)
+            perf.file_bytes('plot', output)
+        logger.info('figures saved: {0}'.format(output))
+        return [output]
+    finally:
+        pool.close()
+        pool.join()
+        if pagedir is not None:
+            shutil.rmtree(pagedir, ignore_errors=True)
+
+
 class HCColor(object):
     kelly = np.array([
         [255, 179, 0], [128, 62, 117], [255, 104, 0], [166, 189, 215],
@@ -319,42 +1101,83 @@ class SolarizedColor(object):
     colortable = [red, blue, yellow, magenta, orange, green, cyan, violet]
 
     @staticmethod
-    def hsv(c, h=None, s=None, v=None, frac=False):
-        '''Quickly change the color in hsv space'''
-        if isinstance(c, str):
-            rgb = np.array([[mc.hex2color(c), ]])
-        else:  # rgb
-            rgb = np.array([[c[:3], ]])
+    def rgb(c):
+        '''Return colors as an (N, 3) array, and whether `c` was a single
+        color (hex string or rgb(a) tuple) rather than a list of them'''
+        import matplotlib.colors as mc
+        if isinstance(c, _string_types):
+            return np.array([mc.to_rgb(c)]), True
+        if isinstance(c, np.ndarray) and c.dtype.kind == 'f':
+            rgb = np.atleast_2d(c)[..., :3]
+            return rgb.reshape(-1, 3), c.ndim == 1
+        if len(c) in (3, 4) and not isinstance(c[0], _string_types) and \
+                np.isscalar(c[0]):
+            return np.array([c[:3]], dtype=float), True
+        return mc.to_rgba_array(c)[:, :3], False
+
+    @classmethod
+    def hsv(cls, c, h=None, s=None, v=None, frac=False):
+        '''Quickly change the color in hsv space; `c` and the h, s, v
+        values can be arrays of N colors'''
+        import matplotlib.colors as mc
+        rgb, single = cls.rgb(c)
         hsv = mc.rgb_to_hsv(rgb)
-        # print c
-        # print rgb
-        # print hsv
         for i, j in enumerate([h, s, v]):
             if j is not None:
                 if frac:
-                    if j < 1:
-                        hsv[0][0][i] = hsv[0][0][i] * j
-                    else:
-                        hsv[0][0][i] = hsv[0][0][i] + \
-                                (1 - hsv[0][0][i]) * (1 - j)
+                    j = np.asarray(j, dtype=float)
+                    hsv[:, i] = np.where(j < 1, hsv[:, i] * j,
+                                         hsv[:, i] + (1 - hsv[:, i]) * (1 - j))
                 else:
-                    hsv[0][0][i] = j
-        return mc.hsv_to_rgb(hsv)[0][0]
+                    hsv[:, i] = j
+        rgb = mc.hsv_to_rgb(hsv)
+        return rgb[0] if single else rgb
 
     @classmethod
     def wash(cls, c):
         return cls.hsv(c, s=0.1, v=0.9)
 
-    @staticmethod
-    def blend(c1, c2, a=0.5):
-        if isinstance(c1, str):
-            c1 = mc.hex2color(c1)
-        if isinstance(c2, str):
-            c2 = mc.hex2color(c2)
-        return (c1[0] * a + (1 - a) * c2[0],
-                c1[1] * a + (1 - a) * c2[1],
-                c1[2] * a + (1 - a) * c2[2],
-                )
+    @classmethod
+    def blend(cls, c1, c2, a=0.5):
+        '''Mix colors c1 and c2 with weight `a` of c1; any of them can be
+        arrays of N'''
+        rgb1, single1 = cls.rgb(c1)
+        rgb2, single2 = cls.rgb(c2)
+        a = np.asarray(a, dtype=float)
+        rgb = rgb1 * a[..., None] + rgb2 * (1 - a[..., None])
+        if single1 and single2 and a.ndim == 0:
+            return tuple(rgb[0])
+        return rgb
+
+
+_cmap_cache = {}
+
+
+def palette_cmap(key):
+    '''Return the colormap of a palette: 'kelly' and 'paul' of HCColor,
+    or 'solarized'; map integer labels to colors with cmap(labels %
+    cmap.N). Created once'''
+    cmap = _cmap_cache.get(key)
+    if cmap is None:
+        import matplotlib.colors as mc
+        if key == 'solarized':
+            colors = SolarizedColor.colortable
+        else:
+            colors = getattr(HCColor, key)
+        cmap = _cmap_cache[key] = mc.ListedColormap(colors, name=key)
+    return cmap
+
+
+def density_cmap(color):
+    '''Return the colormap going from washed `color` to `color`. Created
+    once per color'''
+    import matplotlib.colors as mc
+    key = ('density', mc.to_hex(color))
+    cmap = _cmap_cache.get(key)
+    if cmap is None:
+        cmap = _cmap_cache[key] = mc.LinearSegmentedColormap.from_list(
+            'density', [SolarizedColor.wash(color), color])
+    return cmap
 
 
 class TexStyle(object):
@@ -382,38 +1205,92 @@ class TexStyle(object):
 
     @staticmethod
     def _escape(s):
+        # draft canvases swap the dash for that of mathtext when drawn
         _s = s.replace('_{', '`"')
-        _s = _s.replace('_', '-').replace('-', r'\text{--}')
+        _s = _s.replace('_', '-').replace('-', TEX_DASH)
         return _s.replace(' ', '\ ').replace('`"', '_{')
 
 
-# global rc params
-matplotlib.style.use('default')
-rc('ps', usedistiller='xpdf')
-rc('font', **font_settings())
-rc('text', **{'usetex': True,
-              'latex.unicode': True,
-              'latex.preamble': [r'\usepackage{amsmath}', ],
-              })
-rc('legend', **{'numpoints': 1,
-                'scatterpoints': 1,
-                # 'handletextpad': 0,
-                })
-rc('axes', prop_cycle=cycler('color', SolarizedColor.colortable))
+_style_state = {'applied': False}
+
+
+def use_style(usetex=True):
+    '''Set the global rc params to the style'''
+    import matplotlib
+    import matplotlib.style
+    from matplotlib import rc
+    from cycler import cycler
+    matplotlib.style.use('default')
+    rc('ps', usedistiller='xpdf')
+    rc('font', **font_settings())
+    rc('text', **{'usetex': usetex,
+                  'latex.unicode': True,
+                  'latex.preamble': [r'\usepackage{amsmath}', ],
+                  })
+    rc('legend', **{'numpoints': 1,
+                    'scatterpoints': 1,
+                    # 'handletextpad': 0,
+                    })
+    rc('axes', prop_cycle=cycler('color', SolarizedColor.colortable))
+    if usetex:
+        use_tex_cache()
+    _style_state['applied'] = True
+    _style_state['mplrc'] = None
+
+
+def use_tex_cache(cachedir=None, max_size=None):
+    '''Keep the LaTeX renderings in `cachedir`, and drop the least
+    recently used ones when they take more than `max_size` MB. The cache is
+    shared by all processes pointing to the same directory'''
+    from matplotlib.texmanager import TexManager
+    from .cache import prune_dir
+    cachedir = cachedir or os.environ.get('MYMPL_TEXCACHE') or \
+        getattr(TexManager, '_texcache', None) or TexManager.texcache
+    if max_size is None:
+        max_size = float(os.environ.get('MYMPL_TEXCACHE_SIZE', 256))
+    cachedir = os.path.abspath(os.path.expanduser(cachedir))
+    if not os.path.isdir(cachedir):
+        os.makedirs(cachedir)
+    for attr in ('texcache', '_texcache'):
+        if hasattr(TexManager, attr):
+            setattr(TexManager, attr, cachedir)
+    if _style_state.get('texcache') != cachedir:
+        # once per process, files in use by others are recent anyway
+        freed = prune_dir(cachedir, max_size * 1024 ** 2)
+        if freed:
+            logging.getLogger(NAME).info(
+                'tex cache: freed {0:.1f}MB'.format(freed / 1024. ** 2))
+        _style_state['texcache'] = cachedir
+    return cachedir
+
+
+@contextmanager
+def style(**kwargs):
+    '''Apply the style within the block, restore the rc params after'''
+    import matplotlib
+    saved = dict(_style_state)
+    with matplotlib.rc_context():
+        use_style(**kwargs)
+        try:
+            yield
+        finally:
+            _style_state.update(saved)
+            _style_state['mplrc'] = None
 
 
 def use_hc_color(key):
+    from matplotlib import rc
+    from cycler import cycler
     rc('axes', prop_cycle=cycler('color', getattr(HCColor, key)))
 
 
 def get_dummy_leg():
+    import matplotlib.patches
     return matplotlib.patches.Rectangle((1, 1), 1, 1,
                                         fill=False, edgecolor='none',
                                         visible=False), \
             dict(handletextpad=0, handlelength=0, frameon=False)
 
 
-logging.basicConfig(format='[%(name)s] %(message)s', level=logging.DEBUG)
-
 if __name__ == '__main__':
     SolarizedColor.wash(SolarizedColor.red)
@@ -0,0 +1,216 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Create Date    :  2026-10-19 10:05
+# Python Version :  %PYVER%
+# Git Repo       :  https://github.com/Jerry-Ma
+# Email Address  :  jerry.ma.nk@gmail.com
+"""
+perf.py
+
+Lightweight timers, counters and byte meters for the hot paths.
+
+Everything is a no-op until `enable` is called (or PYJERRY_PERF=1 is set
+in the environment). Timers nest, the report keeps the call path so it
+can be written out as folded stacks for flamegraph.pl.
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+import functools
+
+
+class _State(object):
+    enabled = os.environ.get('PYJERRY_PERF', '') not in ('', '0')
+
+
+_state = _State()
+_lock = threading.Lock()
+_local = threading.local()
+_timers = {}    # path -> [count, total, min, max]
+_counters = {}  # name -> count
+_bytes = {}     # name -> bytes
+
+
+def enable(on=True):
+    _state.enabled = bool(on)
+
+
+def enabled():
+    return _state.enabled
+
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+        _bytes.clear()
+
+
+def _stack():
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
+
+
+def _record(path, dt):
+    with _lock:
+        t = _timers.get(path)
+        if t is None:
+            _timers[path] = [1, dt, dt, dt]
+        else:
+            t[0] += 1
+            t[1] += dt
+            t[2] = min(t[2], dt)
+            t[3] = max(t[3], dt)
+
+
+class timer(object):
+    '''Context manager that times the enclosed block under `name`'''
+
+    __slots__ = ('name', 'path', 't0')
+
+    def __init__(self, name):
+        self.name = name
+        self.path = None
+
+    def __enter__(self):
+        if _state.enabled:
+            stack = _stack()
+            stack.append(self.name)
+            self.path = ';'.join(stack)
+            self.t0 = time.time()
+        return self
+
+    def __exit__(self, *args):
+        if self.path is not None:
+            _record(self.path, time.time() - self.t0)
+            _stack().pop()
+            self.path = None
+        return False
+
+
+def timed(name=None):
+    '''Decorator version of `timer`, defaults to the function name'''
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return func(*args, **kwargs)
+            with timer(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    if _state.enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+
+def add_bytes(name, n):
+    if _state.enabled:
+        with _lock:
+            _bytes[name] = _bytes.get(name, 0) + n
+
+
+def file_bytes(name, fname):
+    '''Meter the size of file `fname`; the stat is skipped when disabled'''
+    if _state.enabled and os.path.isfile(fname):
+        add_bytes(name, os.path.getsize(fname))
+
+
+def snapshot(reset_after=False):
+    '''Return the collected numbers as a plain (picklable) dict, e.g. to
+    send back from a worker process and `merge` in the parent'''
+    with _lock:
+        snap = {
+            'timers': dict((k, list(v)) for k, v in _timers.items()),
+            'counters': dict(_counters),
+            'bytes': dict(_bytes),
+            }
+    if reset_after:
+        reset()
+    return snap
+
+
+def merge(snap):
+    '''Fold a `snapshot` from another process into this one'''
+    with _lock:
+        for path, (n, total, tmin, tmax) in snap['timers'].items():
+            t = _timers.get(path)
+            if t is None:
+                _timers[path] = [n, total, tmin, tmax]
+            else:
+                t[0] += n
+                t[1] += total
+                t[2] = min(t[2], tmin)
+                t[3] = max(t[3], tmax)
+        for name, n in snap['counters'].items():
+            _counters[name] = _counters.get(name, 0) + n
+        for name, n in snap['bytes'].items():
+            _bytes[name] = _bytes.get(name, 0) + n
+
+
+def worker_init():
+    '''Pool initializer: start the worker with empty numbers rather than
+    the copy of the parent's it gets from fork'''
+    reset()
+
+
+def worker_result(value):
+    '''Return `value` from a pool worker along with the numbers collected
+    since the last call, for `merge_results` in the parent'''
+    return value, snapshot(reset_after=True) if _state.enabled else None
+
+
+def merge_results(results):
+    '''Iterate the `worker_result`s of a pool, merging their numbers;
+    yield the values'''
+    for value, snap in results:
+        if snap is not None:
+            merge(snap)
+        yield value
+
+
+def report(fname=None):
+    '''Return (and optionally write as json) the report of this run'''
+    snap = snapshot()
+    rep = {
+        'host': socket.gethostname(),
+        'pid': os.getpid(),
+        'time': time.time(),
+        'timers': dict(
+            (k, {'count': n, 'total': total, 'min': tmin, 'max': tmax,
+                 'mean': total / n})
+            for k, (n, total, tmin, tmax) in snap['timers'].items()),
+        'counters': snap['counters'],
+        'bytes': snap['bytes'],
+        }
+    if fname is not None:
+        with open(fname, 'w') as fo:
+            json.dump(rep, fo, indent=2, sort_keys=True)
+    return rep
+
+
+def write_folded(fname):
+    '''Write timers as folded stacks (self time in microseconds), the
+    input format of flamegraph.pl'''
+    snap = snapshot()['timers']
+    child = {}
+    for path, t in snap.items():
+        if ';' in path:
+            parent = path.rsplit(';', 1)[0]
+            child[parent] = child.get(parent, 0.) + t[1]
+    with open(fname, 'w') as fo:
+        for path in sorted(snap):
+            self_time = max(snap[path][1] - child.get(path, 0.), 0.)
+            fo.write('{0} {1:d}\n'.format(path, int(self_time * 1e6)))
+    return fname
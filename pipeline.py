@@ -0,0 +1,344 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Create Date    :  2026-10-19 11:40
+# Python Version :  %PYVER%
+# Git Repo       :  https://github.com/Jerry-Ma
+# Email Address  :  jerry.ma.nk@gmail.com
+"""
+pipeline.py
+
+A small make-like task graph for chaining the astromatic and MOPEX steps.
+
+Tasks declare their input and output files; a task depends on the tasks
+producing its inputs. Only outdated tasks are run, independent ones in
+parallel within a core budget. The state of finished tasks is written
+after each one completes, so an interrupted run resumes where it stopped.
+
+    pl = Pipeline('work/.pipeline.json', ncore=8)
+    for chip in chips:
+        pl.add('sex_' + chip, ['sex', '{input}', '-c', 'default.sex',
+                               '-CATALOG_NAME', '{output}'],
+               inputs=[chip + '.fits'], outputs=[chip + '.cat'])
+    pl.add('scamp', ['scamp', '{inputs}'], inputs=[...], outputs=[...],
+           ncore=8)
+    pl.run()
+"""
+
+import os
+import json
+import time
+import threading
+import subprocess
+import logging
+try:
+    import Queue as queue
+except ImportError:  # python 3
+    import queue
+from multiprocessing import cpu_count
+
+from . import perf
+from .cache import file_stat, file_digest
+
+try:
+    _string_types = basestring
+except NameError:  # python 3
+    _string_types = str
+
+
+class Task(object):
+    '''
+    A step of the pipeline.
+
+    action:
+        a list of arguments or a shell string to run as command, in
+        which {input}, {inputs}, {output} and {outputs} are substituted;
+        or a callable, called as action(inputs, outputs)
+    ncore:
+        number of cores the task occupies when running
+    '''
+
+    def __init__(self, name, action, inputs=(), outputs=(), deps=(),
+                 ncore=1):
+        self.name = name
+        self.action = action
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        self.ncore = ncore
+
+    def __repr__(self):
+        return 'Task({0})'.format(self.name)
+
+    def _subst(self, arg):
+        return arg.format(
+            input=self.inputs[0] if self.inputs else '',
+            inputs=' '.join(self.inputs),
+            output=self.outputs[0] if self.outputs else '',
+            outputs=' '.join(self.outputs))
+
+    def command(self):
+        '''Return the command after substitution, or None for callables'''
+        if callable(self.action):
+            return None
+        if isinstance(self.action, _string_types):
+            return self._subst(self.action)
+        argv = []
+        for arg in self.action:
+            # expand list placeholders into separate arguments
+            if arg == '{inputs}':
+                argv.extend(self.inputs)
+            elif arg == '{outputs}':
+                argv.extend(self.outputs)
+            else:
+                argv.append(self._subst(arg))
+        return argv
+
+    def signature(self):
+        '''Identify the action, so that changing it triggers a rebuild'''
+        if callable(self.action):
+            return '{0}.{1}'.format(getattr(self.action, '__module__', ''),
+                                    getattr(self.action, '__name__', ''))
+        return self.command()
+
+    def execute(self):
+        for outfile in self.outputs:
+            outdir = os.path.dirname(outfile)
+            if outdir and not os.path.isdir(outdir):
+                os.makedirs(outdir)
+        if callable(self.action):
+            return self.action(self.inputs, self.outputs)
+        cmd = self.command()
+        subprocess.check_call(cmd, shell=isinstance(cmd, _string_types))
+
+
+class Pipeline(object):
+    '''
+    Collection of tasks with persistent state.
+
+    statefile:
+        json file recording the signatures of finished tasks
+    check:
+        'mtime' compares size and mtime of the files, 'content' compares
+        their sha1 digests (re-hashed only when size or mtime changed)
+    ncore:
+        core budget shared by the running tasks, default all cores
+    '''
+
+    def __init__(self, statefile='.pipeline.json', check='mtime',
+                 ncore=None):
+        if check not in ('mtime', 'content'):
+            raise ValueError("unknown check '{0}'".format(check))
+        self.logger = logging.getLogger(__name__)
+        self.statefile = os.path.abspath(statefile)
+        self.check = check
+        self.ncore = ncore or cpu_count()
+        self.tasks = {}
+        self._order = []
+        self._producer = None
+        self._lock = threading.Lock()
+        self.state = self._load()
+
+    def add(self, name, action, inputs=(), outputs=(), deps=(), ncore=1):
+        if name in self.tasks:
+            raise ValueError("duplicated task '{0}'".format(name))
+        task = Task(name, action, inputs=inputs, outputs=outputs,
+                    deps=deps, ncore=min(ncore, self.ncore))
+        self.tasks[name] = task
+        self._order.append(name)
+        self._producer = None
+        return task
+
+    def task(self, inputs=(), outputs=(), deps=(), ncore=1, name=None):
+        '''Decorator version of `add` for callables'''
+        def decorator(func):
+            self.add(name or func.__name__, func, inputs=inputs,
+                     outputs=outputs, deps=deps, ncore=ncore)
+            return func
+        return decorator
+
+    def _load(self):
+        try:
+            with open(self.statefile, 'r') as fo:
+                return json.load(fo)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _save(self):
+        tmp = '{0}.{1:d}'.format(self.statefile, os.getpid())
+        with open(tmp, 'w') as fo:
+            json.dump(self.state, fo, indent=1, sort_keys=True)
+        os.rename(tmp, self.statefile)
+
+    def upstream(self, task):
+        '''Return names of the tasks `task` depends on'''
+        if self._producer is None:
+            self._producer = {}
+            for name in self._order:
+                for outfile in self.tasks[name].outputs:
+                    self._producer[os.path.abspath(outfile)] = name
+        deps = set(task.deps)
+        for infile in task.inputs:
+            name = self._producer.get(os.path.abspath(infile))
+            if name is not None and name != task.name:
+                deps.add(name)
+        return deps
+
+    def _closure(self, targets):
+        '''Return the targets and everything they depend on, in the order
+        the tasks are added'''
+        todo = list(targets)
+        seen = set()
+        while todo:
+            name = todo.pop()
+            if name in seen:
+                continue
+            if name not in self.tasks:
+                raise ValueError("unknown task '{0}'".format(name))
+            seen.add(name)
+            todo.extend(self.upstream(self.tasks[name]))
+        return [n for n in self._order if n in seen]
+
+    def _file_sig(self, fname, old=None):
+        stat = file_stat(fname)[1:]
+        if self.check == 'mtime':
+            return stat
+        # only re-hash when size or mtime changed
+        if old is not None and old[:2] == stat:
+            return old
+        return stat + [file_digest(fname)]
+
+    def _sigs(self, files, old=None):
+        old = old or {}
+        return dict((f, self._file_sig(f, old.get(f))
+                     if os.path.isfile(f) else None) for f in files)
+
+    def _same(self, a, b):
+        if self.check == 'content':
+            return a is not None and b is not None and a[2:] == b[2:]
+        return a == b
+
+    def outdated(self, task, rebuilt=()):
+        '''Return the reason `task` needs to run, or None'''
+        for outfile in task.outputs:
+            if not os.path.exists(outfile):
+                return 'missing {0}'.format(outfile)
+        if rebuilt and self.upstream(task) & set(rebuilt):
+            return 'upstream rebuilt'
+        record = self.state.get(task.name)
+        if record is None:
+            if self.check == 'mtime' and task.outputs and task.inputs:
+                # adopt outputs produced before the pipeline tracked them
+                oldest = min(os.path.getmtime(f) for f in task.outputs)
+                if all(os.path.getmtime(f) <= oldest for f in task.inputs
+                       if os.path.exists(f)):
+                    return None
+            return 'no record'
+        if record['action'] != task.signature():
+            return 'action changed'
+        for kind, files in (('inputs', task.inputs),
+                            ('outputs', task.outputs)):
+            old = record[kind]
+            if sorted(old) != sorted(os.path.abspath(f) for f in files):
+                return '{0} changed'.format(kind)
+            for fname in files:
+                fname = os.path.abspath(fname)
+                if not os.path.isfile(fname):
+                    if old[fname] is not None:
+                        return '{0} changed'.format(fname)
+                    continue
+                if not self._same(old[fname],
+                                  self._file_sig(fname, old[fname])):
+                    return '{0} changed'.format(fname)
+        return None
+
+    def _record(self, task):
+        old = self.state.get(task.name, {})
+        inputs = [os.path.abspath(f) for f in task.inputs]
+        outputs = [os.path.abspath(f) for f in task.outputs]
+        with self._lock:
+            self.state[task.name] = {
+                'action': task.signature(),
+                'inputs': self._sigs(inputs, old.get('inputs')),
+                'outputs': self._sigs(outputs),
+                'time': time.time(),
+                }
+            self._save()
+
+    def _run_task(self, task, done):
+        try:
+            with perf.timer('pipeline.{0}'.format(task.name)):
+                task.execute()
+            missing = [f for f in task.outputs if not os.path.exists(f)]
+            if missing:
+                raise RuntimeError('{0} did not produce {1}'.format(
+                    task.name, ', '.join(missing)))
+            self._record(task)
+            done.put((task, None))
+        except Exception as e:
+            done.put((task, e))
+
+    def run(self, targets=None, dry_run=False):
+        '''Bring `targets` (default all tasks) up to date. Return the names
+        of the tasks that ran'''
+        names = self._closure(targets or self._order)
+        deps = dict((n, self.upstream(self.tasks[n])) for n in names)
+        pending = list(names)
+        finished = set()
+        rebuilt = []
+        failed = []
+        running = {}
+        done = queue.Queue()
+        while pending or running:
+            progress = False
+            for name in pending[:]:
+                if failed:
+                    break
+                if not deps[name] <= finished:
+                    continue
+                task = self.tasks[name]
+                reason = self.outdated(task, rebuilt)
+                if reason is None:
+                    pending.remove(name)
+                    finished.add(name)
+                    progress = True
+                    continue
+                used = sum(t.ncore for t in running.values())
+                if running and used + task.ncore > self.ncore:
+                    continue
+                pending.remove(name)
+                progress = True
+                self.logger.info("+ {0} ({1})".format(name, reason))
+                if dry_run:
+                    finished.add(name)
+                    rebuilt.append(name)
+                    continue
+                running[name] = task
+                t = threading.Thread(target=self._run_task,
+                                     args=(task, done))
+                t.daemon = True
+                t.start()
+            if failed and not running:
+                break
+            if not running:
+                if not progress:
+                    # whatever is left waits on a cycle
+                    raise RuntimeError('unresolvable tasks: {0}'.format(
+                        ', '.join(pending)))
+                continue
+            while True:
+                # poll so that KeyboardInterrupt gets through on python 2
+                try:
+                    task, error = done.get(timeout=1)
+                    break
+                except queue.Empty:
+                    pass
+            del running[task.name]
+            if error is None:
+                finished.add(task.name)
+                rebuilt.append(task.name)
+            else:
+                self.logger.error("! {0}: {1}".format(task.name, error))
+                failed.append(task.name)
+        if failed:
+            raise RuntimeError('failed tasks: {0}'.format(', '.join(failed)))
+        return rebuilt
@@ -0,0 +1,264 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Create Date    :  2026-10-19 12:31
+# Python Version :  %PYVER%
+# Git Repo       :  https://github.com/Jerry-Ma
+# Email Address  :  jerry.ma.nk@gmail.com
+"""
+scheduler.py
+
+Run SExtractor/SCAMP/SWarp jobs side by side within the memory and core
+budget of the local machine.
+
+The memory and thread count of a job are taken, in order of preference,
+from the job itself, from the recorded peak memory of earlier jobs of the
+same kind, or from the NTHREADS/MEM_MAX/COMBINE_BUFSIZE keys of its
+config file and command line. Jobs are packed largest first.
+
+The module doubles as a stand-in executable for testing the packing:
+
+    python -m pyjerry.scheduler --mem 500 --sec 2
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import subprocess
+from multiprocessing import cpu_count
+
+
+DEFAULT_MEM = 256  # MB, for jobs we know nothing about
+
+
+def total_memory():
+    '''Return the physical memory in MB'''
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // \
+        1024 ** 2
+
+
+def read_astromatic_resources(conffile=None, argv=None):
+    '''Return (mem, nthreads) set by an astromatic config and command line
+    overrides like "-NTHREADS 4"; either is None when not specified'''
+    keys = {}
+    if conffile is not None:
+        with open(conffile, 'r') as fo:
+            for ln in fo:
+                kv = ln.split('#', 1)[0].split(None, 1)
+                if len(kv) == 2:
+                    keys[kv[0]] = kv[1].strip()
+    argv = argv or []
+    for i, arg in enumerate(argv[:-1]):
+        if arg.startswith('-') and arg[1:].isupper():
+            keys[arg[1:]] = argv[i + 1]
+    nthreads = keys.get('NTHREADS')
+    if nthreads is not None:
+        nthreads = int(nthreads) or cpu_count()
+    mem = None
+    if 'MEM_MAX' in keys:
+        mem = int(keys['MEM_MAX']) + int(keys.get('COMBINE_BUFSIZE', 0))
+    return mem, nthreads
+
+
+class Job(object):
+    '''
+    A command with its resource needs.
+
+    mem:
+        peak memory in MB
+    nthreads:
+        cores used
+    kind:
+        jobs of the same kind share memory history, default to the name
+        of the executable
+    '''
+
+    def __init__(self, name, cmd, mem=None, nthreads=None, kind=None,
+                 conffile=None):
+        self.name = name
+        self.cmd = list(cmd)
+        self.kind = kind or os.path.basename(self.cmd[0])
+        if conffile is None and '-c' in self.cmd[:-1]:
+            conffile = self.cmd[self.cmd.index('-c') + 1]
+        cmem, cthreads = read_astromatic_resources(
+            conffile if conffile and os.path.isfile(conffile) else None,
+            self.cmd[1:])
+        self.conf_mem = cmem
+        self.mem = mem
+        self.nthreads = nthreads or cthreads or 1
+        self.pid = None
+        self.start = self.end = None
+        self.peak_mem = None
+        self.returncode = None
+
+    def __repr__(self):
+        return 'Job({0}, mem={1}, nthreads={2})'.format(
+            self.name, self.mem, self.nthreads)
+
+
+class JobHistory(object):
+    '''Peak memory of finished jobs, per kind, kept in a json file'''
+
+    def __init__(self, filename):
+        self.filename = filename
+        try:
+            with open(filename, 'r') as fo:
+                self.peaks = json.load(fo)
+        except (IOError, OSError, ValueError):
+            self.peaks = {}
+
+    def estimate(self, kind, margin=1.2):
+        peak = self.peaks.get(kind)
+        return None if peak is None else int(peak * margin)
+
+    def record(self, kind, peak):
+        self.peaks[kind] = max(self.peaks.get(kind, 0), peak)
+
+    def save(self):
+        with open(self.filename, 'w') as fo:
+            json.dump(self.peaks, fo, indent=1, sort_keys=True)
+
+
+class Scheduler(object):
+    '''
+    Pack jobs onto the local machine.
+
+    mem:
+        memory budget in MB, default 90% of the physical memory
+    ncore:
+        core budget, default all cores
+    history:
+        a JobHistory used to estimate and record peak memory
+    '''
+
+    def __init__(self, mem=None, ncore=None, history=None):
+        self.logger = logging.getLogger(__name__)
+        self.mem = mem or int(total_memory() * 0.9)
+        self.ncore = ncore or cpu_count()
+        self.history = history
+        self.jobs = []
+
+    def add(self, name, cmd, **kwargs):
+        job = Job(name, cmd, **kwargs)
+        self.jobs.append(job)
+        return job
+
+    def estimate(self, job):
+        '''Fill in the memory of `job` if not given'''
+        if job.mem is None and self.history is not None:
+            job.mem = self.history.estimate(job.kind)
+        if job.mem is None:
+            job.mem = job.conf_mem or DEFAULT_MEM
+        return job
+
+    def _fits(self, job, used_mem, used_core):
+        return used_mem + job.mem <= self.mem and \
+            used_core + job.nthreads <= self.ncore
+
+    def _reap(self, job, status, rusage):
+        job.end = time.time()
+        job.returncode = os.WEXITSTATUS(status) \
+            if os.WIFEXITED(status) else -os.WTERMSIG(status)
+        # kB on linux, bytes on mac
+        scale = 1024. ** 2 if sys.platform == 'darwin' else 1024.
+        job.peak_mem = rusage.ru_maxrss / scale
+        if self.history is not None and job.returncode == 0:
+            self.history.record(job.kind, job.peak_mem)
+        self.logger.info("- {0} ({1:.1f}s, {2:.0f}MB)".format(
+            job.name, job.end - job.start, job.peak_mem))
+
+    def _wait(self, running, procs, poll=0.05):
+        '''Wait for at least one of our own jobs to finish'''
+        # wait on our pids only, wait4(-1) would reap other children
+        # of the process as well
+        while True:
+            done = []
+            for pid, job in list(running.items()):
+                wpid, status, rusage = os.wait4(pid, os.WNOHANG)
+                if wpid == 0:
+                    continue
+                del running[pid]
+                self._reap(job, status, rusage)
+                # tell Popen it is gone so it does not wait on it again
+                procs[pid].returncode = job.returncode
+                done.append(job)
+            if done or not running:
+                return done
+            time.sleep(poll)
+
+    def run(self):
+        '''Run all jobs, return the utilization report'''
+        for job in self.jobs:
+            self.estimate(job)
+        # first fit decreasing
+        pending = sorted(self.jobs, key=lambda j: (-j.mem, -j.nthreads))
+        running = {}
+        procs = {}
+        t0 = time.time()
+        while pending or running:
+            used_mem = sum(j.mem for j in running.values())
+            used_core = sum(j.nthreads for j in running.values())
+            for job in pending[:]:
+                if running and not self._fits(job, used_mem, used_core):
+                    continue
+                if not running and not self._fits(job, 0, 0):
+                    self.logger.warning(
+                        "{0} exceeds the budget, run it alone".format(
+                            job.name))
+                pending.remove(job)
+                job.start = time.time()
+                proc = subprocess.Popen(job.cmd)
+                job.pid = proc.pid
+                procs[job.pid] = proc
+                running[job.pid] = job
+                used_mem += job.mem
+                used_core += job.nthreads
+                self.logger.info("+ {0} ({1}MB, {2} threads)".format(
+                    job.name, job.mem, job.nthreads))
+            self._wait(running, procs)
+        if self.history is not None:
+            self.history.save()
+        report = self.report(t0, time.time())
+        failed = [j.name for j in self.jobs if j.returncode != 0]
+        if failed:
+            raise RuntimeError('failed jobs: {0}'.format(', '.join(failed)))
+        return report
+
+    def report(self, t0, t1):
+        '''Return the time-averaged use of the memory and core budgets'''
+        span = max(t1 - t0, 1e-9)
+        mem = sum(j.mem * (j.end - j.start) for j in self.jobs)
+        peak = sum((j.peak_mem or 0) * (j.end - j.start) for j in self.jobs)
+        core = sum(j.nthreads * (j.end - j.start) for j in self.jobs)
+        report = {
+            'wall': span,
+            'njob': len(self.jobs),
+            'mem_reserved': mem / (self.mem * span),
+            'mem_used': peak / (self.mem * span),
+            'core': core / (self.ncore * span),
+            }
+        self.logger.info(
+            "{njob} jobs in {wall:.1f}s, memory reserved {mem_reserved:.0%} "
+            "used {mem_used:.0%}, cores {core:.0%}".format(**report))
+        return report
+
+
+def fake_job(argv=None):
+    '''Stand-in executable: hold `mem` MB for `sec` seconds'''
+    parser = argparse.ArgumentParser(description='stand-in job')
+    parser.add_argument('--mem', type=int, default=100)
+    parser.add_argument('--sec', type=float, default=1.)
+    parser.add_argument('-c', help='config file, ignored')
+    args, _ = parser.parse_known_args(argv)
+    block = bytearray(args.mem * 1024 ** 2)
+    for i in range(0, len(block), 4096):
+        block[i] = 1
+    time.sleep(args.sec)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(fake_job())
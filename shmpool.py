@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Create Date    :  2026-10-19 14:20
+# Python Version :  %PYVER%
+# Git Repo       :  https://github.com/Jerry-Ma
+# Email Address  :  jerry.ma.nk@gmail.com
+"""
+shmpool.py
+
+Pool of fixed-size image slots in shared memory, so that worker processes
+work on frames without pickling them.
+
+    pool = FramePool(8, (4644, 2112))
+    handles = [pool.put(chip_data) for chip_data in chips]
+    results = Pool(4).map(measure, handles)   # measure(h): attach(h)...
+    for h in handles:
+        pool.release(h)
+
+Uses multiprocessing.shared_memory when available (python 3.8+), and a
+memory mapped file in /dev/shm otherwise.
+"""
+
+import os
+import time
+import uuid
+import mmap
+import tempfile
+import threading
+import numpy as np
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+
+SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+_attached = {}  # buffers attached in this process, by name
+
+
+def _open_buffer(name, size, create=False):
+    if shared_memory is not None:
+        if create:
+            return shared_memory.SharedMemory(
+                name=name, create=True, size=size)
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            # the creating process owns the segment
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except (ImportError, AttributeError, KeyError):
+            pass
+        return shm
+    fname = os.path.join(SHM_DIR, name)
+    fd = os.open(fname, os.O_RDWR | (os.O_CREAT | os.O_EXCL if create else 0))
+    try:
+        if create:
+            os.ftruncate(fd, size)
+        return mmap.mmap(fd, size)
+    finally:
+        os.close(fd)
+
+
+def _buffer(buf):
+    return buf.buf if shared_memory is not None else buf
+
+
+def attach(handle):
+    '''Return the array of a slot handle, without copying. The mapping is
+    kept for the life of the process, so attaching again is cheap'''
+    name, size, nslot, shape, dtype, slot = handle
+    buf = _attached.get(name)
+    if buf is None:
+        buf = _attached[name] = _open_buffer(name, size)
+    arrays = np.ndarray((nslot, ) + tuple(shape), dtype=dtype,
+                        buffer=_buffer(buf))
+    return arrays[slot]
+
+
+class FramePool(object):
+    '''
+    `nslot` frames of `shape` and `dtype` in one shared memory block.
+
+    put/acquire hand out free slots and block while all of them are in
+    use; release puts a slot back.
+    '''
+
+    def __init__(self, nslot, shape, dtype='f4'):
+        self.nslot = nslot
+        self.shape = tuple(int(n) for n in shape)
+        self.dtype = np.dtype(dtype).str
+        self.name = 'pyjerry_{0}'.format(uuid.uuid4().hex[:16])
+        self.size = int(nslot * np.prod(self.shape) *
+                        np.dtype(dtype).itemsize)
+        self._buf = _open_buffer(self.name, self.size, create=True)
+        self.arrays = np.ndarray((nslot, ) + self.shape, dtype=self.dtype,
+                                 buffer=_buffer(self._buf))
+        self._free = list(range(nslot))
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def handle(self, slot):
+        return (self.name, self.size, self.nslot, self.shape, self.dtype,
+                slot)
+
+    def acquire(self, timeout=None):
+        '''Return the handle of a free slot'''
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while not self._free:
+                # wait() returns None on python 2, check the time instead
+                left = None if deadline is None else deadline - time.time()
+                if left is not None and left <= 0:
+                    raise RuntimeError('no free slot in frame pool')
+                self._cond.wait(left)
+            return self.handle(self._free.pop())
+
+    def release(self, handle):
+        with self._cond:
+            slot = handle[-1]
+            if slot not in self._free:
+                self._free.append(slot)
+            self._cond.notify()
+
+    def put(self, frame, timeout=None):
+        '''Copy `frame` into a free slot and return its handle'''
+        handle = self.acquire(timeout=timeout)
+        self.arrays[handle[-1]][...] = frame
+        return handle
+
+    def get(self, handle):
+        return self.arrays[handle[-1]]
+
+    def close(self):
+        '''Free the shared memory; handles become invalid'''
+        if self._buf is None:
+            return
+        self.arrays = None
+        self._buf.close()
+        if shared_memory is not None:
+            self._buf.unlink()
+        else:
+            os.remove(os.path.join(SHM_DIR, self.name))
+        self._buf = None
+
+
+def imap_frames(pool, procpool, func, frames):
+    '''Stream `frames` through shared memory slots of `pool` into
+    `func(handle)` run by `procpool`, yield the results in order. A slot
+    is recycled as soon as its frame is processed'''
+    frames = iter(frames)
+    inflight = []
+    for frame in frames:
+        handle = pool.put(frame)
+        inflight.append((handle, procpool.apply_async(func, (handle, ))))
+        while inflight and (inflight[0][1].ready() or
+                            len(inflight) >= pool.nslot):
+            handle, result = inflight.pop(0)
+            value = result.get()
+            pool.release(handle)
+            yield value
+    for handle, result in inflight:
+        value = result.get()
+        pool.release(handle)
+        yield value
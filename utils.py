@@ -13,8 +13,17 @@ Provide various helper functions
 import re
 import os
 import glob
+import json
+import atexit
+import threading
 import logging
 import logging.config
+try:
+    from logging.handlers import QueueHandler, QueueListener
+except ImportError:  # python 2
+    QueueHandler = QueueListener = None
+
+from . import perf
 
 
 def update_progress(mesg, perc):
@@ -56,13 +65,26 @@ def get_scamp_checkplot_name(dirname, prefix=''):
                      for i in scamp_checkplot])
 
 
-def dump_astromatic_conf(infile, outfile, clobber=False, **kwargs):
+@perf.timed('config')
+def dump_astromatic_conf(infile, outfile, clobber=False, cache=None,
+                         **kwargs):
+    """render config template with overrides; `cache` is an OutputCache
+    that skips the rendering when nothing changed since last run"""
 
     logger = logging.getLogger(__name__)
+    # one read, readlines is slow on StringIO
+    text = infile.read()
+    if cache is not None:
+        cache_key = cache.fingerprint(
+            ['dump_astromatic_conf', outfile, text, kwargs],
+            files=[getattr(infile, 'name', '')])
+        if cache.fetch(cache_key, [outfile], clobber=clobber):
+            logger.info("=> {0:s}".format(outfile))
+            return outfile
     if os.path.isfile(outfile) and not clobber:
         raise ValueError("file exist:{0}".format(outfile))
     with open(outfile, 'w') as fo:
-        for oln in infile.readlines():
+        for oln in text.splitlines(True):
             ln = oln.strip()
             if len(ln) == 0 or ln.startswith("#"):
                 fo.write(oln)
@@ -91,10 +113,14 @@ def dump_astromatic_conf(infile, outfile, clobber=False, **kwargs):
                             jv = oln.index('#')
                         fo.write(oln[:iv] + oln[iv:jv].replace(val, newval) +
                                  oln[jv:])
+    if cache is not None:
+        cache.store(cache_key, [outfile])
+    perf.file_bytes('config', outfile)
     logger.info("+> {0:s}".format(outfile))
     return outfile
 
 
+@perf.timed('config')
 def dump_sex_param(infile, outfile, *args, **kwargs):
 
     logger = logging.getLogger(__name__)
@@ -111,10 +137,18 @@ def dump_sex_param(infile, outfile, *args, **kwargs):
         'ERRA_WORLD', 'ERRB_WORLD', 'ERRTHETA_WORLD',
         'FLAGS', 'FLAGS_WEIGHT', 'FLAGS_WIN',
         'FWHM_IMAGE', 'ELLIPTICITY', 'CLASS_STAR']
+    content = infile.getvalue()
+    cache = kwargs.get('cache', None)
+    if cache is not None:
+        cache_key = cache.fingerprint(
+            ['dump_sex_param', outfile, content, args])
+        if cache.fetch(cache_key, [outfile],
+                       clobber=kwargs.get('clobber', False)):
+            logger.info("=> {0:s}".format(outfile))
+            return outfile
     if os.path.isfile(outfile) and not kwargs.get('clobber', False):
         raise ValueError("file exist:{0}".format(outfile))
     with open(outfile, 'w') as fo:
-        content = infile.getvalue()
         for key in common + list(args):
             if key in content:
                 fo.write('{0:23s}  #\n'.format(key))
@@ -122,28 +156,124 @@ def dump_sex_param(infile, outfile, *args, **kwargs):
                 raise ValueError('Not a valid output para: {0:s}'.format(key))
         fo.write('#' * 26 + '\n')
         fo.write(content)
+    if cache is not None:
+        cache.store(cache_key, [outfile])
+    perf.file_bytes('config', outfile)
     logger.info("+> {0:s}".format(outfile))
     return outfile
 
 
-def sorted_glob(pattern):
-
+def alphanum_key(s):
+    """ Turn a string into a list of string and number chunks.
+        "z23a" -> ["z", 23, "a"]
+    """
     def tryint(s):
         try:
             return int(s)
         except ValueError:
             return s
+    return [tryint(c) for c in re.split('([0-9]+)', s)]
+
+
+@perf.timed('sorted_glob')
+def sorted_glob(pattern):
+    files = sorted(glob.glob(pattern), key=alphanum_key)
+    perf.count('sorted_glob.files', len(files))
+    return files
+
+
+if QueueHandler is None:
+    class QueueHandler(logging.Handler):
+        """send records to a queue, to be handled by a QueueListener"""
+
+        def __init__(self, queue):
+            logging.Handler.__init__(self)
+            self.queue = queue
+
+        def prepare(self, record):
+            # merge args and traceback so the record pickles cheaply
+            self.format(record)
+            record.msg = record.message
+            record.args = None
+            record.exc_info = None
+            return record
+
+        def emit(self, record):
+            try:
+                self.queue.put_nowait(self.prepare(record))
+            except Exception:
+                self.handleError(record)
+
+    class QueueListener(object):
+        """pass records from a queue to handlers in a background thread"""
+        _sentinel = None
+
+        def __init__(self, queue, *handlers, **kwargs):
+            self.queue = queue
+            self.handlers = handlers
+            self.respect_handler_level = kwargs.get(
+                'respect_handler_level', False)
+            self._thread = None
+
+        def start(self):
+            self._thread = t = threading.Thread(target=self._monitor)
+            t.daemon = True
+            t.start()
 
-    def alphanum_key(s):
-        """ Turn a string into a list of string and number chunks.
-            "z23a" -> ["z", 23, "a"]
-        """
-        return [tryint(c) for c in re.split('([0-9]+)', s)]
-    return sorted(glob.glob(pattern), key=alphanum_key)
+        def handle(self, record):
+            for handler in self.handlers:
+                if not self.respect_handler_level or \
+                        record.levelno >= handler.level:
+                    handler.handle(record)
 
+        def _monitor(self):
+            while True:
+                record = self.queue.get()
+                if record is self._sentinel:
+                    break
+                self.handle(record)
 
-def init_logging():
+        def stop(self):
+            self.queue.put_nowait(self._sentinel)
+            self._thread.join()
+            self._thread = None
 
+
+class JsonFormatter(logging.Formatter):
+    """format records as one json object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'name': record.name,
+            'process': record.processName,
+            'message': record.getMessage(),
+            }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry)
+
+
+_log_listener = None
+
+
+def init_logging(level='INFO', queue=False, jsonl=False):
+    """configure the root logger.
+
+    queue:
+        route records through a multiprocessing queue to a single
+        listener thread, so that logging calls in the main process and
+        in worker processes never block on the stream. The queue is
+        returned, pass it to `init_worker_logging` in pool workers
+        started with spawn; forked workers inherit the setup
+    jsonl:
+        write records as json lines instead of plain text
+    """
+    global _log_listener
+    formatter = 'jsonl' if jsonl else 'short'
     logging.config.dictConfig({
         'version': 1,
         'formatters': {
@@ -153,19 +283,55 @@ def init_logging():
             'short': {
                 'format': '[%(levelname)s] %(name)s: %(message)s'
             },
+            'jsonl': {
+                '()': JsonFormatter,
+            },
         },
         'handlers': {
             'default': {
-                'level': 'INFO',
+                'level': level,
                 'class': 'logging.StreamHandler',
-                'formatter': 'short',
+                'formatter': formatter,
             },
         },
         'loggers': {
             '': {
                 'handlers': ['default'],
-                'level': 'INFO',
+                'level': level,
                 'propagate': False
             },
         }
     })
+    if not queue:
+        return None
+    import multiprocessing
+    root = logging.getLogger()
+    stream_handler = root.handlers[0]
+    q = multiprocessing.Queue(-1)
+    shutdown_logging()
+    _log_listener = QueueListener(q, stream_handler)
+    _log_listener.start()
+    root.removeHandler(stream_handler)
+    root.addHandler(QueueHandler(q))
+    return q
+
+
+def init_worker_logging(queue, level='INFO'):
+    """route records of a worker process to the queue returned by
+    `init_logging`; usable as the initializer of a pool"""
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(queue))
+    root.setLevel(level)
+
+
+def shutdown_logging():
+    """flush and stop the listener started by `init_logging`"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+atexit.register(shutdown_logging)
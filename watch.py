@@ -0,0 +1,187 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Create Date    :  2026-10-19 13:52
+# Python Version :  %PYVER%
+# Git Repo       :  https://github.com/Jerry-Ma
+# Email Address  :  jerry.ma.nk@gmail.com
+"""
+watch.py
+
+Pick up new frames as they land during a run and stream them into
+processing.
+
+    watcher = DirWatcher('incoming/*/*.fits.fz')
+    for fname, result, error in stream(watcher, quicklook, nworker=4):
+        ...
+"""
+
+import os
+import glob
+import time
+import fnmatch
+import logging
+import threading
+try:
+    import Queue as queue
+except ImportError:  # python 3
+    import queue
+
+from .utils import alphanum_key
+
+try:
+    _string_types = basestring
+except NameError:  # python 3
+    _string_types = str
+
+
+class DirWatcher(object):
+    '''
+    Track files matching glob `patterns` and report each of them once,
+    after its size and mtime stayed the same for `settle` seconds.
+
+    Directory listings are cached and only redone for directories whose
+    mtime changed since the last poll.
+
+    existing:
+        report the files already present at the first poll, otherwise
+        only the ones arriving later
+    '''
+
+    def __init__(self, patterns, settle=2.0, interval=1.0, existing=True):
+        self.logger = logging.getLogger(__name__)
+        if isinstance(patterns, _string_types):
+            patterns = [patterns]
+        self.patterns = [os.path.abspath(p) for p in patterns]
+        self.settle = settle
+        self.interval = interval
+        self._listing = {}   # (dir, pattern) -> (mtime, files)
+        self._pending = {}   # file -> (size, mtime, time stable since)
+        self._seen = set()
+        if not existing:
+            self._seen.update(self._candidates())
+
+    def _list(self, dirname, basepattern):
+        key = (dirname, basepattern)
+        try:
+            mtime = os.stat(dirname).st_mtime
+        except OSError:
+            self._listing.pop(key, None)
+            return []
+        cached = self._listing.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        names = [os.path.join(dirname, n) for n in fnmatch.filter(
+            os.listdir(dirname), basepattern)]
+        self._listing[key] = (mtime, names)
+        return names
+
+    def _candidates(self):
+        files = set()
+        for pattern in self.patterns:
+            dirpattern, basepattern = os.path.split(pattern)
+            if glob.has_magic(dirpattern):
+                dirs = glob.glob(dirpattern)
+            else:
+                dirs = [dirpattern]
+            for dirname in dirs:
+                files.update(self._list(dirname, basepattern))
+        return files - self._seen
+
+    def poll(self):
+        '''Return the files that became complete since the last poll'''
+        now = time.time()
+        ready = []
+        for fname in self._candidates():
+            try:
+                st = os.stat(fname)
+            except OSError:
+                self._pending.pop(fname, None)
+                continue
+            state = self._pending.get(fname)
+            if state is None or state[:2] != (st.st_size, st.st_mtime):
+                self._pending[fname] = (st.st_size, st.st_mtime, now)
+            elif now - state[2] >= self.settle and \
+                    now - st.st_mtime >= self.settle:
+                ready.append(fname)
+        for fname in ready:
+            del self._pending[fname]
+            self._seen.add(fname)
+        if ready:
+            self.logger.debug("{0:d} new files".format(len(ready)))
+        return sorted(ready, key=alphanum_key)
+
+    def watch(self, stop=None, timeout=None):
+        '''Yield new files as they complete, until the `stop` event is set
+        or nothing arrived for `timeout` seconds'''
+        last = time.time()
+        while stop is None or not stop.is_set():
+            ready = self.poll()
+            for fname in ready:
+                yield fname
+            if ready:
+                last = time.time()
+            elif timeout is not None and time.time() - last > timeout:
+                return
+            if stop is not None:
+                stop.wait(self.interval)
+            else:
+                time.sleep(self.interval)
+
+    __iter__ = watch
+
+
+def stream(watcher, func, nworker=4, maxsize=8, stop=None, timeout=None):
+    '''Run `func(fname)` on the files reported by `watcher` with a pool of
+    `nworker` threads, yield (fname, result, error) as they finish.
+
+    At most `maxsize` files wait in the queue; when the workers fall
+    behind, the watcher stops polling until there is room again'''
+    logger = logging.getLogger(__name__)
+    todo = queue.Queue(maxsize)
+    done = queue.Queue()
+    stop = stop or threading.Event()
+    sentinel = object()
+
+    def produce():
+        try:
+            for fname in watcher.watch(stop=stop, timeout=timeout):
+                while not stop.is_set():
+                    try:
+                        todo.put(fname, timeout=0.5)
+                        break
+                    except queue.Full:
+                        pass
+        finally:
+            for _ in range(nworker):
+                todo.put(sentinel)
+
+    def consume():
+        while True:
+            fname = todo.get()
+            if fname is sentinel:
+                done.put(sentinel)
+                return
+            try:
+                done.put((fname, func(fname), None))
+            except Exception as e:
+                logger.error("! {0}: {1}".format(fname, e))
+                done.put((fname, None, e))
+
+    threads = [threading.Thread(target=produce)] + [
+        threading.Thread(target=consume) for _ in range(nworker)]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    nalive = nworker
+    try:
+        while nalive:
+            try:
+                item = done.get(timeout=1)
+            except queue.Empty:
+                continue
+            if item is sentinel:
+                nalive -= 1
+                continue
+            yield item
+    finally:
+        stop.set()